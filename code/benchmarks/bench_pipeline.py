@@ -0,0 +1,295 @@
+"""End-to-end throughput benchmark for the extraction -> matching -> metrics pipeline.
+
+Runs every stage against the local mock completion server (llm/mock_server.py) with
+synthetic papers, claims and citances, and writes the measurements as JSON so runs
+can be diffed for regressions:
+
+    python benchmarks/bench_pipeline.py --papers 1000 --corpora 200 --output bench.json
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+CODE_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# The drivers read these at import time: point them at the mock server, disable the
+# response cache (every request must reach the server) and satisfy the API key check
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ["LLM_CACHE_PATH"] = ""
+
+sys.path.append(CODE_ROOT)
+sys.path.append(os.path.join(CODE_ROOT, 'claim_extraction'))
+sys.path.append(os.path.join(CODE_ROOT, 'eval'))
+
+WORDS = ("model network training accuracy dataset transformer attention baseline improves "
+         "results method proposed novel performance task learning evaluation benchmark").split()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the claim extraction and evaluation pipeline against a mock API.")
+    parser.add_argument('--papers', type=int, default=1000, help="Number of synthetic papers for process_papers.")
+    parser.add_argument('--corpora', type=int, default=200, help="Number of synthetic corpora for process_corpus and metrics.")
+    parser.add_argument('--citances_per_corpus', type=int, default=40, help="Citances per synthetic corpus.")
+    parser.add_argument('--claims_per_corpus', type=int, default=15, help="Claims per synthetic corpus.")
+    parser.add_argument('--body_words', type=int, default=3000, help="Words in each synthetic paper body.")
+    parser.add_argument('--micro_iterations', type=int, default=2000, help="Iterations for prompt-build and parse micro-benchmarks.")
+    parser.add_argument('--token_budget', type=int, default=None, help="Passed to eval_with_gpt: pack comparison prompts by token budget instead of batch size.")
+    parser.add_argument('--latency', type=float, default=0.05, help="Median mock server latency in seconds.")
+    parser.add_argument('--error_rate', type=float, default=0.0, help="Mock server 500 probability.")
+    parser.add_argument('--rate_limit_rate', type=float, default=0.0, help="Mock server random 429 probability.")
+    parser.add_argument('--port', type=int, default=8011, help="Port for the in-process mock server.")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed.")
+    parser.add_argument('--output', type=str, default=None, help="Write the results JSON here (default: stdout only).")
+    return parser.parse_args()
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(q / 100 * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+def latency_summary(latencies) -> dict:
+    values = sorted(latencies)
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values) if values else None,
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99)
+    }
+
+
+def sentence(rng, words=12):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def make_synthetic_papers(count, body_words, rng):
+    papers = []
+    for i in range(count):
+        sections = []
+        for heading in ["1 Introduction", "2 Method", "3 Results", "4 Conclusion"]:
+            sections.append(heading + "\n\n" + " ".join(sentence(rng) for _ in range(body_words // 48)))
+        papers.append({
+            "corpusId": i + 1,
+            "title": sentence(rng, 8),
+            "abstract": " ".join(sentence(rng) for _ in range(5)),
+            "fields": ["Computer Science"],
+            "year": 2024,
+            "contents": "\n\n".join(sections)
+        })
+    return papers
+
+
+def make_synthetic_corpora(count, citances_per_corpus, claims_per_corpus, rng):
+    corpora = {}
+    for i in range(count):
+        citances = [{"citance": sentence(rng), "score": rng.randint(0, 10)} for _ in range(citances_per_corpus)]
+        claims = [
+            {"claim": sentence(rng), "theme": rng.choice(["Novelty", "Performance"]), "section_name": rng.choice(["Abstract", "Results"])}
+            for _ in range(claims_per_corpus)
+        ]
+        corpora[str(i + 1)] = {"citances": citances, "claims": claims}
+    return corpora
+
+
+def make_model_outputs(count, rng):
+    """Claim-extraction answers in the shapes seen in practice: clean, fenced and trailing-comma JSON."""
+    outputs = []
+    for i in range(count):
+        claims = [{"claim": sentence(rng), "section_name": "Results", "context": "", "theme": "Performance"} for _ in range(8)]
+        text = json.dumps(claims, indent=2)
+        if i % 3 == 1:
+            text = "```json\n" + text + "\n```"
+        elif i % 3 == 2:
+            text = text[:-1].rstrip() + ",\n]"
+        outputs.append(text)
+    return outputs
+
+
+async def bench_process_papers(args, papers, workdir):
+    import claim_extraction
+    from data_io.papers import PaperStore
+
+    dataset = os.path.join(workdir, 'papers.jsonl')
+    with open(dataset, 'w', encoding='utf-8') as f:
+        for paper in papers:
+            f.write(json.dumps(paper) + '\n')
+    output_file = os.path.join(workdir, 'claims.jsonl')
+
+    start = time.perf_counter()
+    paper_store = PaperStore.open(dataset)
+    index_seconds = time.perf_counter() - start
+
+    # Time each paper from the start of its processing to its result
+    latencies = []
+    process_single_paper = claim_extraction.process_single_paper
+
+    async def timed_process_single_paper(*a, **kw):
+        t0 = time.perf_counter()
+        try:
+            return await process_single_paper(*a, **kw)
+        finally:
+            latencies.append(time.perf_counter() - t0)
+
+    claim_extraction.process_single_paper = timed_process_single_paper
+    try:
+        start = time.perf_counter()
+        await claim_extraction.process_papers(paper_store.ids(), paper_store, output_file)
+        elapsed = time.perf_counter() - start
+    finally:
+        claim_extraction.process_single_paper = process_single_paper
+
+    return {
+        "papers": len(papers),
+        "index_seconds": index_seconds,
+        "seconds": elapsed,
+        "papers_per_second": len(papers) / elapsed if elapsed else None,
+        "latency": latency_summary(latencies)
+    }
+
+
+def bench_prompt_build(papers, iterations):
+    from prompts.claim_extraction_prompt import prepare_claim_extraction_message, prepare_claim_extraction_messages
+
+    results = {}
+    for name, func in [("prepare_claim_extraction_message", prepare_claim_extraction_message),
+                       ("prepare_claim_extraction_messages", prepare_claim_extraction_messages)]:
+        start = time.perf_counter()
+        for i in range(iterations):
+            paper = papers[i % len(papers)]
+            func(paper["title"], paper["abstract"], paper["contents"])
+        elapsed = time.perf_counter() - start
+        results[name] = {"calls": iterations, "seconds": elapsed, "calls_per_second": iterations / elapsed, "us_per_call": elapsed / iterations * 1e6}
+    return results
+
+
+def bench_clean_and_convert(outputs):
+    import claim_extraction
+
+    start = time.perf_counter()
+    parsed = 0
+    for text in outputs:
+        if claim_extraction.clean_and_convert(text):
+            parsed += 1
+    elapsed = time.perf_counter() - start
+    return {
+        "calls": len(outputs),
+        "parsed": parsed,
+        "seconds": elapsed,
+        "calls_per_second": len(outputs) / elapsed,
+        "us_per_call": elapsed / len(outputs) * 1e6
+    }
+
+
+async def bench_process_corpus(args, corpora):
+    import aiohttp
+    import eval_with_gpt
+
+    argv = ['--base_url', f"http://127.0.0.1:{args.port}/v1"]
+    if args.token_budget:
+        argv += ['--token_budget', str(args.token_budget)]
+    eval_args = eval_with_gpt.parse_args(argv)
+    eval_with_gpt.request_stats.clear()
+    sem = asyncio.Semaphore(eval_args.max_concurrent_requests)
+    cache = {}
+    latencies = []
+
+    async with aiohttp.ClientSession() as session:
+        async def run(corpus_id, data):
+            t0 = time.perf_counter()
+            result = await eval_with_gpt.process_corpus(
+                corpus_id, data['citances'], data['claims'], eval_args, session, sem, "benchmark", "gpt-4o"
+            )
+            latencies.append(time.perf_counter() - t0)
+            return result
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*[run(corpus_id, data) for corpus_id, data in corpora.items()])
+        elapsed = time.perf_counter() - start
+
+    matches = 0
+    for corpus_id, corpus_data in results:
+        cache[corpus_id] = corpus_data
+        matches += sum(len(view) for view in corpus_data['matches'].values())
+    prompts = eval_with_gpt.request_stats['prompts']
+    return cache, {
+        "corpora": len(corpora),
+        "matches": matches,
+        "prompts": prompts,
+        "seconds": elapsed,
+        "matches_per_second": matches / elapsed if elapsed else None,
+        "prompts_per_second": prompts / elapsed if elapsed else None,
+        "prompt_tokens_per_request": eval_with_gpt.request_stats['prompt_tokens'] / prompts if prompts else None,
+        "corpus_latency": latency_summary(latencies)
+    }
+
+
+def bench_metrics(cache):
+    import inference_with_gpt
+
+    start = time.perf_counter()
+    for corpus_id, data in cache.items():
+        for metric in ('coverage', 'precision'):
+            inference_with_gpt.calculate_metrics_from_cache(corpus_id, data, 6, 8, metric)
+    elapsed = time.perf_counter() - start
+    return {
+        "corpora": len(cache),
+        "seconds": elapsed,
+        "corpora_per_second": len(cache) / elapsed if elapsed else None
+    }
+
+
+async def main():
+    args = parse_args()
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{args.port}/v1"
+    rng = random.Random(args.seed)
+
+    from llm.mock_server import start_mock_server
+
+    papers = make_synthetic_papers(args.papers, args.body_words, rng)
+    corpora = make_synthetic_corpora(args.corpora, args.citances_per_corpus, args.claims_per_corpus, rng)
+    outputs = make_model_outputs(args.micro_iterations, rng)
+
+    server, runner = await start_mock_server(
+        port=args.port, latency=args.latency, error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate, seed=args.seed
+    )
+    results = {
+        "config": vars(args),
+        "python": sys.version.split()[0],
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")
+    }
+    try:
+        # The drivers print per request/corpus; keep that out of the measurement output
+        with contextlib.redirect_stdout(io.StringIO()):
+            import claim_extraction  # noqa: F401  (configures logging at import)
+            logging.getLogger().setLevel(logging.WARNING)
+            with tempfile.TemporaryDirectory() as workdir:
+                results["process_papers"] = await bench_process_papers(args, papers, workdir)
+            results["prompt_build"] = bench_prompt_build(papers, args.micro_iterations)
+            results["clean_and_convert"] = bench_clean_and_convert(outputs)
+            cache, results["process_corpus"] = await bench_process_corpus(args, corpora)
+            results["calculate_metrics_from_cache"] = bench_metrics(cache)
+        results["mock_server"] = server.counts
+    finally:
+        await runner.cleanup()
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -20,8 +20,13 @@ import sys
 # Add the path to the `calls` module to the Python path
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
 sys.path.append(project_root)
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
+import calls.vespa as vespa
 from calls.vespa import get_paper_by_id, display_paper
+from data_io.jsonl_sink import JsonlSink, read_record_keys
+from data_io.paper_cache import get_paper_cache
+from pipeline.worker_pool import imap_unordered
 #%%
 # Apply nested asyncio
 nest_asyncio.apply()
@@ -35,25 +40,96 @@ INPUT_CSV = 'citances.csv'
 TEMP_JSON = 'extracted_citances_output.json'
 FINAL_JSON = 'extracted_citances_output.json'
 CORPUS_IDS_TXT = 'corpus_ids.txt'
+FULL_DATASET_JSONL = 'full_dataset.jsonl'
+MIN_CONTENTS_LENGTH = 500
+MAX_CONCURRENT_FETCHES = 32
+BULK_BATCH_SIZE = 100
+
+# Batch-by-ids endpoint of the paper store, used instead of one request per paper when available
+get_papers_by_ids = getattr(vespa, 'get_papers_by_ids', None)
+
+
+async def fetch_paper_details(paper_ids: list) -> dict:
+    """Fetches papers from the remote store: {paper_id: details} for the ids it returns."""
+    if get_papers_by_ids is None:
+        return {paper_id: display_paper(await get_paper_by_id(paper_id)) for paper_id in paper_ids}
+    papers = await get_papers_by_ids(paper_ids)
+    if not isinstance(papers, dict):
+        papers = dict(zip(paper_ids, papers))
+    return {paper_id: display_paper(papers[paper_id]) for paper_id in paper_ids if papers.get(paper_id) is not None}
+
+
+async def get_paper_details_batch(paper_ids: list) -> list:
+    """
+    Paper details for a batch of ids, in the same order; None for ids the store does not
+    return. Reads through the local paper cache, so only uncached papers are fetched.
+    """
+    cache = get_paper_cache()
+    found = cache.get_many(paper_ids) if cache is not None else {}
+    missing = [paper_id for paper_id in paper_ids if int(paper_id) not in found]
+    if missing:
+        fetched = await fetch_paper_details(missing)
+        if cache is not None:
+            cache.put_many(fetched)
+        found.update({int(paper_id): output for paper_id, output in fetched.items()})
+    return [found.get(int(paper_id)) for paper_id in paper_ids]
 
 
 async def get_paper_details(paper_id: str) -> dict:
-    paper_details = asyncio.run(get_paper_by_id(paper_id))
-    output = display_paper(paper_details)
-    return output
-    #check_full_text_exists  if "contents" in not empty or none then save 
-
-#save the output to a json file if the full text exists
-async def check_full_text_exists(ids: list) -> list:
-    results = []
-    for paper_id in tqdm(ids, desc="Checking full text existence", unit="paper"):
-        output = await get_paper_details(paper_id)
-        if len(output['contents'])>500:
-            output['corpusID'] = paper_id 
-            results.append(output)
-            
-    with open('full_dataset.json', 'w') as f:
-        json.dump(results, f, indent=4)
+    return (await get_paper_details_batch([paper_id]))[0]
+
+
+def has_full_text(output) -> bool:
+    return bool(output) and len(output.get('contents') or '') > MIN_CONTENTS_LENGTH
+
+
+#save each paper to a JSONL file as soon as its full text is found
+async def check_full_text_exists(ids: list, output_file: str = FULL_DATASET_JSONL,
+                                 num_workers: int = MAX_CONCURRENT_FETCHES) -> list:
+    """
+    Fetches papers with `num_workers` requests in flight (batches of BULK_BATCH_SIZE ids
+    when the store has a bulk endpoint) and appends those with full text to `output_file`.
+    Papers already in the file are not fetched again.
+
+    Returns one {'paper_id', 'full_text_exists'} record per id. Ids of a failed bulk
+    batch are fetched again one at a time; ids that still fail get no record, since
+    a failed fetch says nothing about full text, and are fetched again on the next run.
+    """
+    existing = read_record_keys(output_file, 'corpusID') if os.path.exists(output_file) else set()
+    pending = [paper_id for paper_id in ids if paper_id not in existing]
+    results = [{'paper_id': paper_id, 'full_text_exists': True} for paper_id in ids if paper_id in existing]
+
+    batch_size = BULK_BATCH_SIZE if get_papers_by_ids is not None else 1
+    batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+    with JsonlSink(output_file) as sink, tqdm(total=len(pending), desc="Checking full text existence", unit="paper") as pbar:
+        async def check(batches) -> list:
+            """Records the papers of the batches and returns the ids of the batches that failed."""
+            failed = []
+            async for batch, outputs in imap_unordered(get_paper_details_batch, batches, num_workers):
+                if outputs is None:
+                    failed.extend(batch)
+                    continue
+                for paper_id, output in zip(batch, outputs):
+                    exists = has_full_text(output)
+                    if exists:
+                        output['corpusID'] = paper_id
+                        sink.write(output)
+                    results.append({'paper_id': paper_id, 'full_text_exists': exists})
+                pbar.update(len(batch))
+            return failed
+
+        failed = await check(batches)
+        if failed and batch_size > 1:
+            # One bad id or a transient error fails a whole bulk batch
+            logger.warning(f"{len(failed)} papers were in failed bulk batches; fetching them one at a time")
+            failed = await check([[paper_id] for paper_id in failed])
+
+    if failed:
+        logger.warning(f"Could not fetch {len(failed)} papers; they are left out of the results and retried on the next run")
+    logger.info(f"Wrote {sink.records_written} papers with full text to {output_file}")
+    if get_paper_cache() is not None:
+        logger.info(f"Paper cache: {get_paper_cache().stats()}")
+    return results
 
 
 
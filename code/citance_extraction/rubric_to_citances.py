@@ -23,27 +23,20 @@ sys.path.append(project_root)
 
 # Import custom modules
 from prompts.rubric_prompt import rubric_query
+from llm.backend import get_backend
 
 
-headers = {
-    "Content-Type": "application/json",
-    "Authorization": f"Bearer {OPENAI_API_KEY}"
-}
-
 async def get_one_completion(content,model=model,temperature=0.0):
     start_time = time.perf_counter()  # Record the start time for this request
     async with aiohttp.ClientSession() as session:
-        # Make a POST request to OpenAI's API for text completion
-        async with session.post("https://api.openai.com/v1/chat/completions", headers=headers, json={
-            "model": model,
-            "messages": [{"role": "user", "content": content}],
-            "temperature": temperature
-        }) as resp:
-            response_json = await resp.json()
-            end_time = time.perf_counter()  # Record the end time for this request
-            elapsed_time = end_time - start_time
-            print(f"Request for content '{content}' took {elapsed_time:.2f} seconds.")
-            return response_json["choices"][0]['message']["content"]
+        # Send the request to the configured completion backend (OPENAI_BASE_URL)
+        answer = await get_backend(api_key=OPENAI_API_KEY).complete(
+            session, [{"role": "user", "content": content}], model=model, temperature=temperature
+        )
+        end_time = time.perf_counter()  # Record the end time for this request
+        elapsed_time = end_time - start_time
+        print(f"Request for content '{content}' took {elapsed_time:.2f} seconds.")
+        return answer
 
 
 
@@ -18,73 +18,51 @@ logger = logging.getLogger(__name__)
 
 # Append the parent directory to the system path for imports (adjust the path as needed)
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 # Import custom modules
 
-from prompts.claim_extraction_prompt import prepare_claim_extraction_message
+from prompts.claim_extraction_prompt import prepare_claim_extraction_messages
+from data_io.papers import PaperStore, iter_json_records, iter_papers, normalize_paper
+from data_io.paper_cache import get_paper_cache
+from data_io.jsonl_sink import JsonlSink, read_record_keys
+from pipeline.worker_pool import imap_unordered
+from llm.backend import get_backend
+from llm.response_cache import get_response_cache
+from llm.parsing import is_parseable, parse_json_tiered, parse_stats
+from section_resolver import get_section_resolver
 
 model="fine_tuned_model"
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY") 
 
 
-# Define headers for API requests
-headers = {
-    "Content-Type": "application/json",
-    "Authorization": f"Bearer {OPENAI_API_KEY}"
-}
-
-async def completion(content, session, model=model, temperature=0.0):
+async def completion(content, session, model=model, temperature=0.0, refresh_cache=False):
        start_time = time.perf_counter()
-       
-       # Define headers within the function
-       headers = {
-           "Content-Type": "application/json",
-           "Authorization": f"Bearer {OPENAI_API_KEY}"
-       }
-   
+
        # content is already a dictionary, so use it directly
        message_data = content
        messages = message_data.get("messages", [])
-   
-       # Prepare the messages for the API
-       api_messages = []
-       for message in messages:
-           role = message.get("role")
-           content_value = message.get("content", "")
-           # Ensure the content is a string
-           if isinstance(content_value, str):
-               content_text = content_value
-           else:
-               # Serialize content to a JSON-formatted string if it's a dictionary
-               content_text = json.dumps(content_value, ensure_ascii=False)
-           api_messages.append({"role": role, "content": content_text})
-   
-       # Make a POST request to OpenAI's API for text completion
-       async with session.post(
-           "https://api.openai.com/v1/chat/completions",
-           headers=headers,
-           json={
-               "model": model,
-               "messages": api_messages,
-               "temperature": temperature
-           }
-       ) as resp:
-           if resp.status != 200:
-               response_text = await resp.text()
-               raise Exception(f"API call failed with status {resp.status}: {response_text}")
-           response_json = await resp.json()
-           
+
+       # Send the messages to the configured completion backend (OPENAI_BASE_URL)
+       response_text = await get_backend(api_key=OPENAI_API_KEY).complete(
+           session, messages, model=model, temperature=temperature, refresh_cache=refresh_cache,
+           validate=is_parseable
+       )
+
        end_time = time.perf_counter()
        elapsed_time = end_time - start_time
        print(f"Request took {elapsed_time:.2f} seconds.")
-   
-       return response_json["choices"][0]['message']["content"]
+
+       return response_text
 
 
 # Paths to your data files
-full_data = 'full_dataset.json'
-FINAL_JSON = 'weakly_supervised_extracted_claims.json'
+# citance_extration.py writes full_dataset.jsonl; older runs wrote a JSON array
+full_data = 'full_dataset.jsonl' if os.path.exists('full_dataset.jsonl') else 'full_dataset.json'
+FINAL_JSON = 'weakly_supervised_extracted_claims.jsonl'
+# Output of older runs, a JSON array; migrated into FINAL_JSON so resuming skips its papers
+LEGACY_FINAL_JSON = 'weakly_supervised_extracted_claims.json'
 
 # Ensure OPENAI_API_KEY is defined
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
@@ -92,24 +70,20 @@ if not OPENAI_API_KEY:
     logger.error("OPENAI_API_KEY environment variable is not set.")
     sys.exit(1)
 
-# Function to clean and convert JSON strings using a tolerant parser
+# Function to clean and convert JSON strings, cheapest parser first
 def clean_and_convert(json_string):
     """
-    Cleans and converts a JSON string using demjson3, with a fallback to regex extraction.
+    Parses the model's claims JSON with tiered parsers: strict json, a light repair pass
+    (code fences, trailing commas, truncated arrays), demjson3, and finally regex extraction.
     """
-    # Remove code block markers and extra annotations
-    json_string = json_string.strip().strip('```json').strip('```').strip()
-    try:
-        # Attempt to parse using demjson
-        return demjson.decode(json_string)
-    except demjson.JSONDecodeError as e:
-        logger.error(f"demjson.JSONDecodeError: {e}")
-        logger.warning("Attempting to extract data using regex.")
-        # Fallback to regex extraction
-        return extract_claims_with_regex(json_string)
-    except Exception as e:
-        logger.error(f"An unexpected error occurred: {e}")
+    result = parse_json_tiered(json_string, fallbacks=[
+        ("demjson", demjson.decode),
+        ("regex", extract_claims_with_regex)
+    ])
+    if result is None:
+        logger.error("All parsers failed on the model output.")
         return []
+    return result
 
 # Function to extract claims using regex as a fallback
 def extract_claims_with_regex(json_string):
@@ -145,11 +119,10 @@ def extract_claims_with_regex(json_string):
     return claims_list
 
 
-# Function to extract claims from a paper
-async def extract_claims_from_paper(title: str, abstract: str, contents: str, session) -> list:
-    prompt = prepare_claim_extraction_message(title, abstract, contents)
+# Function to extract claims from one prepared message (a whole paper or one chunk of it)
+async def extract_claims_from_message(prompt: dict, session, refresh_cache: bool = False) -> list:
     try:
-        result = await completion(prompt, session,model=model)
+        result = await completion(prompt, session,model=model, refresh_cache=refresh_cache)
         logger.debug(f"Raw model output: {result}")
         # Extract the assistant's message content
         if isinstance(result, dict):
@@ -167,10 +140,11 @@ async def extract_claims_from_paper(title: str, abstract: str, contents: str, se
         logger.error(f"Error extracting claims: {e}")
         return []
 
-# Function to retry claim extraction with multiple attempts
-async def retry_extract_claims_from_paper(title: str, abstract: str, contents: str, session, retries: int = 10) -> list:
+# Function to retry claim extraction of one message with multiple attempts
+async def retry_extract_claims_from_message(prompt: dict, session, retries: int = 10) -> list:
     for attempt in range(retries):
-        result = await extract_claims_from_paper(title, abstract, contents, session)
+        # Retries must not be served the cached response that just failed
+        result = await extract_claims_from_message(prompt, session, refresh_cache=attempt > 0)
         if result and isinstance(result, list):  # Check if the result is not empty and is a list
             return result
         logger.warning(f"Attempt {attempt + 1} failed, retrying...")
@@ -178,204 +152,173 @@ async def retry_extract_claims_from_paper(title: str, abstract: str, contents: s
     logger.error("Failed to extract claims after multiple attempts.")
     return []
 
+# Function to merge the claims of several chunks, dropping duplicates
+def merge_claims(chunk_results: list) -> list:
+    merged = []
+    seen = set()
+    for claims in chunk_results:
+        for claim in claims:
+            if not isinstance(claim, dict):
+                continue
+            key = " ".join(re.sub(r'[^\w\s]', '', str(claim.get('claim', ''))).lower().split())
+            if key and key not in seen:
+                seen.add(key)
+                merged.append(claim)
+    return merged
+
+# Function to extract claims from a paper; long bodies are split into token-budgeted
+# chunks that are extracted concurrently and merged
+async def retry_extract_claims_from_paper(title: str, abstract: str, contents: str, session, retries: int = 10) -> list:
+    messages = prepare_claim_extraction_messages(title, abstract, contents)
+    if len(messages) == 1:
+        return await retry_extract_claims_from_message(messages[0], session, retries)
+
+    logger.debug(f"Paper body split into {len(messages)} chunks")
+    chunk_results = await asyncio.gather(*[
+        retry_extract_claims_from_message(message, session, retries) for message in messages
+    ])
+    return merge_claims(chunk_results)
+
 # Function to create a list of claims with IDs
 def create_claims_list(claims, starting_id):
+    # "section" keeps the heading the model reported; "section_name" is its mapped label (or None)
+    resolver = get_section_resolver()
     return [
         {
             "claim": claim.get('claim', ''),
             "section": claim.get('section_name', ''),  # Updated field name
             "context": claim.get('context', ''),
             "id": str(starting_id + i),
-            "theme": claim.get('theme', '')
+            "theme": claim.get('theme', ''),
+            "section_name": resolver.resolve(claim.get('section_name', ''))
         }
         for i, claim in enumerate(claims)
     ]
 
-# Function to read existing corpus IDs from the output file
+# Function to read existing corpus IDs from the output file (JSONL sink or legacy JSON array)
 def read_existing_corpus_ids(output_file: str):
     if not os.path.exists(output_file):
         return set()
 
-    with open(output_file, "r") as f:
-        try:
-            existing_data = json.load(f)
-        except json.JSONDecodeError:
-            logger.error("Error decoding JSON from the output file.")
-            return set()
-
-    return {item.get("corpusid") for item in existing_data if "corpusid" in item}
+    try:
+        return read_record_keys(output_file, "corpusid")
+    except Exception as e:
+        logger.error(f"Error reading corpus IDs from the output file: {e}")
+        return set()
 
-# Updated display_paper_details function with error handling
-def display_paper_details(json_file_path):
+# Convert the JSON array written by older runs into the JSONL output, once
+def migrate_legacy_output(legacy_file: str, output_file: str):
+    if not os.path.exists(legacy_file) or os.path.exists(output_file):
+        return
+    # Written aside and renamed, so a crash never leaves a partial output that stops the migration
+    temp_file = output_file + '.tmp'
+    if os.path.exists(temp_file):
+        os.remove(temp_file)
+    with JsonlSink(temp_file, fsync_every=float('inf'), fsync_interval=float('inf')) as sink:
+        for record in iter_json_records(legacy_file):
+            sink.write(record)
+    os.replace(temp_file, output_file)
+    logger.info(f"Migrated {sink.records_written} papers from {legacy_file} to {output_file}")
+
+# Load paper details by streaming the dataset (JSON array or JSONL)
+def display_paper_details(json_file_path, fields=None):
     paper_details = []
-    all_corpus_ids = []
-
     try:
-        with open(json_file_path, 'r', encoding='utf-8') as file:
-            # Try to load the entire JSON file
-            json_file = json.load(file)
-    except json.JSONDecodeError as e:
-        logger.error(f"JSONDecodeError while loading file: {e}")
-        logger.info("Attempting to load JSON line by line.")
-        # Attempt to read JSON objects line by line
-        with open(json_file_path, 'r', encoding='utf-8') as file:
-            for line_num, line in enumerate(file, 1):
-                line = line.strip()
-                if not line:
-                    continue
-                try:
-                    item = json.loads(line)
-                    corpus_id = item.get("corpusID") or item.get("corpusId")
-                    if corpus_id is not None:
-                        corpus_id = int(corpus_id)
-                        all_corpus_ids.append(corpus_id)
-                        paper_details.append({
-                            "corpusId": corpus_id,
-                            "title": str(item.get("title")),
-                            "field": str(item.get("fields")),
-                            "year": str(item.get("year")),
-                            "abstract": str(item.get("abstract")),
-                            "contents": str(item.get("contents"))
-                        })
-                except json.JSONDecodeError as e_line:
-                    logger.error(f"JSONDecodeError at line {line_num}: {e_line}")
-                    logger.error(f"Problematic line: {line}")
-                except Exception as e_line:
-                    logger.error(f"Unexpected error at line {line_num}: {e_line}")
-                    logger.error(f"Problematic line: {line}")
+        for paper in iter_papers(json_file_path, fields):
+            paper_details.append(paper)
     except Exception as e:
         logger.error(f"An unexpected error occurred while loading the JSON file: {e}")
-    else:
-        # JSON loaded successfully
-        for item in json_file:
-            corpus_id = item.get("corpusID") or item.get("corpusId")
-            if corpus_id is not None:
-                corpus_id = int(corpus_id)
-                all_corpus_ids.append(corpus_id)
-                paper_details.append({
-                    "corpusId": corpus_id,
-                    "title": str(item.get("title")),
-                    "field": str(item.get("fields")),
-                    "year": str(item.get("year")),
-                    "abstract": str(item.get("abstract")),
-                    "contents": str(item.get("contents"))
-                })
 
     # Log all corpus IDs loaded from the dataset for debugging
-    logger.debug(f"Available Corpus IDs in dataset: {all_corpus_ids}")
+    logger.debug(f"Available Corpus IDs in dataset: {[paper.get('corpusId') for paper in paper_details]}")
 
     return paper_details
 
-# Function to process a batch of papers asynchronously
-async def process_papers_batch(paper_ids: list, output_file: str, semaphore, session, checkpoint_interval: int = 20, pbar=None):
-    # Load all paper details once (move this outside the function to avoid reloading for each batch)
-    papers_info = display_paper_details(full_data)
-
-    async def process_single_paper(paper_id):
-        async with semaphore:  # Ensuring semaphore limit is applied correctly
-            try:
-                # Find the paper with the matching corpusId
-                paper_info = next((paper for paper in papers_info if paper["corpusId"] == paper_id), None)
-                if not paper_info:
-                    logger.warning(f"Paper ID {paper_id} not found in dataset.")
-                    return None
-
-                # Provide title, abstract, and contents explicitly
-                title = paper_info["title"]
-                abstract = paper_info["abstract"]
-                contents = paper_info["contents"]
-
-                # Extract claims
-                claims = await retry_extract_claims_from_paper(title, abstract, contents, session)
-
-                if not claims:
-                    logger.warning(f"No claims extracted for Paper ID {paper_id}.")
-                    return None
-
-                starting_id = 1
-                claims_list = create_claims_list(claims, starting_id)
-
-                paper_output = {
-                    "corpusid": paper_id,
-                    "claims": claims_list
-                }
-
-                return paper_output  # Return the result
-
-            except Exception as e:
-                logger.error(f"An error occurred while processing paper ID {paper_id}: {e}")
-                return None
-            finally:
-                if pbar is not None:
-                    pbar.update(1)
-
-    tasks = [process_single_paper(paper_id) for paper_id in paper_ids]
-    # Run tasks concurrently
-    results = await asyncio.gather(*tasks)
-    # Collect non-None results
-    final_output = [result for result in results if result is not None]
-
-    # Checkpointing
-    if len(final_output) > 0 and len(final_output) % checkpoint_interval == 0:
-        checkpoint_file = output_file + ".checkpoint"
-        with open(checkpoint_file, "w") as f:
-            json.dump(final_output, f, indent=4)
-
-    return final_output
-
-# Function to process all papers
-async def process_papers(paper_ids: list, output_file: str, checkpoint_interval: int = 20, batch_size: int = 1224):
-    semaphore = asyncio.Semaphore(value=80)  # Limit to 80 concurrent requests
-    final_output = []
-    total_papers = len(paper_ids)
-    pbar = tqdm.tqdm(total=total_papers, desc="Processing all Papers")
+# Look up a paper in the dataset, falling back to the local paper cache filled by citance_extration.py
+def load_paper(paper_id, paper_store: PaperStore):
+    paper_info = paper_store.get(paper_id)
+    if paper_info is None and get_paper_cache() is not None:
+        cached = get_paper_cache().get(paper_id)
+        if cached is not None:
+            paper_info = normalize_paper(cached)
+    return paper_info
+
+# Function to process a single paper; the result is persisted as soon as it is ready
+async def process_single_paper(paper_id, paper_store: PaperStore, sink: JsonlSink, session):
+    try:
+        # Look up the paper by corpusId
+        paper_info = load_paper(paper_id, paper_store)
+        if not paper_info:
+            logger.warning(f"Paper ID {paper_id} not found in dataset.")
+            return None
+
+        # Provide title, abstract, and contents explicitly
+        title = paper_info["title"]
+        abstract = paper_info["abstract"]
+        contents = paper_info["contents"]
+
+        # Extract claims
+        claims = await retry_extract_claims_from_paper(title, abstract, contents, session)
+
+        if not claims:
+            logger.warning(f"No claims extracted for Paper ID {paper_id}.")
+            return None
+
+        starting_id = 1
+        claims_list = create_claims_list(claims, starting_id)
+
+        paper_output = {
+            "corpusid": paper_id,
+            "claims": claims_list
+        }
 
-    async with aiohttp.ClientSession() as session:
-        for i in range(0, total_papers, batch_size):
-            batch = paper_ids[i:i + batch_size]
-            batch_output = await process_papers_batch(batch, output_file, semaphore, session, checkpoint_interval, pbar)
-            final_output.extend(batch_output)
+        # Persist immediately so a crash only loses papers still in flight
+        sink.write(paper_output)
 
-    pbar.close()
+        return paper_output  # Return the result
 
-    # Save final output to JSON file
-    if os.path.exists(output_file):
-        with open(output_file, "r") as f:
-            try:
-                existing_data = json.load(f)
-            except json.JSONDecodeError:
-                logger.error("Error decoding JSON from the output file.")
-                existing_data = []
-        existing_data.extend(final_output)
-    else:
-        existing_data = final_output
+    except Exception as e:
+        logger.error(f"An error occurred while processing paper ID {paper_id}: {e}")
+        return None
+
+# Function to process all papers with a fixed pool of workers pulling from a shared queue;
+# results are appended to a JSONL sink in completion order
+async def process_papers(paper_ids: list, paper_store: PaperStore, output_file: str, checkpoint_interval: int = 20, num_workers: int = 80):
+    total_papers = len(paper_ids)
+    pbar = tqdm.tqdm(total=total_papers, desc="Processing all Papers")
 
-    with open(output_file, "w") as f:
-        json.dump(existing_data, f, indent=4)
+    # fsync the sink every `checkpoint_interval` papers
+    with JsonlSink(output_file, fsync_every=checkpoint_interval) as sink:
+        async with aiohttp.ClientSession() as session:
+            async def worker(paper_id):
+                return await process_single_paper(paper_id, paper_store, sink, session)
 
-    # Remove the checkpoint file
-    checkpoint_file = output_file + ".checkpoint"
-    if os.path.exists(checkpoint_file):
-        os.remove(checkpoint_file)
+            # At most `num_workers` requests are in flight at any time
+            async for _ in imap_unordered(worker, paper_ids, num_workers):
+                pbar.update(1)
+
+    pbar.close()
+    logger.info(f"Wrote {sink.records_written} papers to {output_file}")
+    if get_response_cache() is not None:
+        logger.info(f"Response cache: {get_response_cache().stats()}")
+    logger.info(f"Model output parse tiers: {dict(parse_stats)}")
 
 # Main execution
 if __name__ == "__main__":
-    # Get paper details
-    all_papers = display_paper_details(full_data)
-    if not all_papers:
+    # Index the dataset once; papers are read from disk as they are processed
+    paper_store = PaperStore.open(full_data)
+    if not len(paper_store):
         logger.error("No papers available to process.")
         sys.exit(1)  # Exit if there are no papers
 
-    paper_ids = [item.get("corpusId") for item in all_papers]
-
-    # Remove None values
-    paper_ids = [pid for pid in paper_ids if pid is not None]
+    paper_ids = paper_store.ids()
 
     # Read existing corpus IDs to avoid reprocessing
+    migrate_legacy_output(LEGACY_FINAL_JSON, FINAL_JSON)
     existing_corpus_ids = read_existing_corpus_ids(FINAL_JSON)
     paper_ids_to_process = [pid for pid in paper_ids if pid not in existing_corpus_ids]
 
     if not paper_ids_to_process:
         logger.info("All papers have been processed already.")
     else:
-        asyncio.run(process_papers(paper_ids_to_process, FINAL_JSON))  # Process all papers
\ No newline at end of file
+        asyncio.run(process_papers(paper_ids_to_process, paper_store, FINAL_JSON))  # Process all papers
\ No newline at end of file
@@ -0,0 +1,141 @@
+import json
+import logging
+import os
+import re
+
+from data_io.papers import SCAN_CHUNK_SIZE
+
+logger = logging.getLogger(__name__)
+
+EVAL_CACHE_KEY = "corpusId"
+
+
+def is_jsonl_cache(file_path: str) -> bool:
+    return os.path.splitext(file_path)[1].lower() == '.jsonl'
+
+
+def eval_cache_record(corpusId, corpus_data: dict) -> dict:
+    """One JSONL line of the eval cache: the corpus data with its corpusId in front."""
+    return {EVAL_CACHE_KEY: str(corpusId), **corpus_data}
+
+
+def _iter_object_items(f, chunk_size: int = SCAN_CHUNK_SIZE):
+    """
+    Incrementally parses the (key, value) items of a top-level JSON object from an open
+    text file, holding roughly one value in memory at a time.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    eof = False
+    started = False
+    while True:
+        # Skip whitespace, the opening brace and separators between items
+        while pos < len(buffer) and (buffer[pos] in ' \t\r\n,' or (not started and buffer[pos] == '{')):
+            started = started or buffer[pos] == '{'
+            pos += 1
+        if pos < len(buffer) and buffer[pos] == '}':
+            return
+        try:
+            if pos >= len(buffer):
+                raise ValueError("buffer exhausted")
+            key, end = decoder.raw_decode(buffer, pos)
+            while end < len(buffer) and buffer[end] in ' \t\r\n:':
+                end += 1
+            if end >= len(buffer):
+                raise ValueError("buffer exhausted")
+            value, end = decoder.raw_decode(buffer, end)
+        except ValueError:
+            if eof:
+                if buffer[pos:].strip():
+                    logger.error("Truncated JSON object at the end of the eval cache")
+                return
+            # Drop what was consumed and pull in more; reading at least the buffer size
+            # keeps a value larger than chunk_size from being re-parsed once per chunk
+            buffer = buffer[pos:]
+            pos = 0
+            chunk = f.read(max(chunk_size, len(buffer)))
+            eof = not chunk
+            buffer += chunk
+            continue
+        yield key, value
+        pos = end
+
+
+def _read_jsonl_record(line: bytes, line_num: int, file_path: str):
+    """Parses one line of a JSONL store into (corpusId, record); None for a bad line."""
+    if not line.strip():
+        return None
+    if not line.endswith(b'\n'):
+        # A record torn by a crash; the corpus is redone on the next run
+        logger.warning(f"Skipping incomplete last line {line_num} in {file_path}")
+        return None
+    try:
+        record = json.loads(line.decode('utf-8'))
+    except (UnicodeDecodeError, json.JSONDecodeError):
+        logger.warning(f"Skipping unreadable line {line_num} in {file_path}")
+        return None
+    corpusId = record.pop(EVAL_CACHE_KEY, None) if isinstance(record, dict) else None
+    if corpusId is None:
+        logger.warning(f"Skipping line {line_num} without {EVAL_CACHE_KEY} in {file_path}")
+        return None
+    return str(corpusId), record
+
+
+def _last_jsonl_lines(file_path: str) -> set:
+    """Line numbers holding the last record of each corpus, found by matching the corpusId only."""
+    pattern = re.compile(rb'"' + re.escape(EVAL_CACHE_KEY.encode('utf-8')) + rb'"\s*:\s*(-?\d+|"(?:[^"\\]|\\.)*")')
+    last = {}
+    with open(file_path, 'rb') as f:
+        for line_num, line in enumerate(f, 1):
+            if not line.endswith(b'\n'):
+                continue
+            match = pattern.search(line)
+            try:
+                if match:
+                    corpusId = json.loads(match.group(1))
+                else:
+                    # Key nested or not a plain value: parse the whole line; bad lines are
+                    # reported by the second pass
+                    corpusId = json.loads(line.decode('utf-8')).get(EVAL_CACHE_KEY)
+            except (ValueError, AttributeError):
+                continue
+            if corpusId is not None:
+                last[str(corpusId)] = line_num
+    return set(last.values())
+
+
+def iter_eval_cache(file_path: str, dedupe: bool = True):
+    """
+    Yields (corpusId, corpus_data) from an eval cache.
+
+    Reads both the per-corpus JSONL store written by eval_with_gpt (one record per
+    line, streamed) and the legacy single JSON object {corpusId: corpus_data}.
+    Both are parsed incrementally, one corpus at a time. A corpus written twice to a
+    JSONL store (a resumed or rerun job) is yielded once with its last record, like
+    load_eval_cache; this costs a first pass that reads only the corpusIds. Unreadable
+    records are logged and skipped.
+    """
+    if not is_jsonl_cache(file_path):
+        with open(file_path, 'r', encoding='utf-8') as f:
+            try:
+                for corpusId, corpus_data in _iter_object_items(f):
+                    yield str(corpusId), corpus_data
+            except UnicodeDecodeError as e:
+                logger.error(f"Stopped reading {file_path}: {e}")
+        return
+
+    keep = _last_jsonl_lines(file_path) if dedupe else None
+    with open(file_path, 'rb') as f:
+        for line_num, line in enumerate(f, 1):
+            # Torn lines still go through _read_jsonl_record, which reports them
+            if keep is not None and line_num not in keep and line.endswith(b'\n'):
+                continue
+            parsed = _read_jsonl_record(line, line_num, file_path)
+            if parsed is not None:
+                yield parsed
+
+
+def load_eval_cache(file_path: str) -> dict:
+    """Reads a whole eval cache (JSONL store or legacy JSON) into {corpusId: corpus_data}."""
+    return dict(iter_eval_cache(file_path))
@@ -0,0 +1,119 @@
+import json
+import os
+import re
+import time
+import logging
+
+from data_io.papers import _is_json_array, iter_json_records
+
+logger = logging.getLogger(__name__)
+
+
+class JsonlSink:
+    """
+    Append-only JSONL writer for pipeline results.
+
+    Every record is flushed to the OS as soon as it is written, so a crashed process
+    loses at most the record in flight. fsync is batched: it runs every `fsync_every`
+    records or `fsync_interval` seconds, whichever comes first, and on close.
+    """
+
+    def __init__(self, file_path: str, fsync_every: int = 20, fsync_interval: float = 5.0):
+        self.file_path = file_path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.records_written = 0
+        self._pending = 0
+        self._last_sync = time.monotonic()
+        directory = os.path.dirname(os.path.abspath(file_path))
+        os.makedirs(directory, exist_ok=True)
+        self._drop_partial_line()
+        self._file = open(file_path, 'ab')
+
+    def _drop_partial_line(self):
+        """Truncates a trailing line left half-written by a crash."""
+        if not os.path.exists(self.file_path):
+            return
+        with open(self.file_path, 'rb+') as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            if size == 0:
+                return
+            f.seek(size - 1)
+            if f.read(1) == b'\n':
+                return
+            # Walk back to the last complete line
+            pos = size
+            while pos > 0:
+                step = min(4096, pos)
+                f.seek(pos - step)
+                block = f.read(step)
+                newline = block.rfind(b'\n')
+                if newline != -1:
+                    pos = pos - step + newline + 1
+                    break
+                pos -= step
+            logger.warning(f"Dropping {size - pos} bytes of incomplete record at the end of {self.file_path}")
+            f.truncate(pos)
+
+    def write(self, record: dict):
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        self._file.write(line.encode('utf-8'))
+        self._file.flush()
+        self.records_written += 1
+        self._pending += 1
+        if self._pending >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+            self.sync()
+
+    def sync(self):
+        if self._pending:
+            os.fsync(self._file.fileno())
+            self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._file.flush()
+        self.sync()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def read_record_keys(file_path: str, key: str) -> set:
+    """
+    Collects the values of one top-level key from a JSONL sink (or a legacy JSON array).
+
+    JSONL lines are matched with a regex on the key so that records are not fully parsed;
+    lines where the key is not a plain number or string fall back to json.loads.
+    """
+    if _is_json_array(file_path):
+        return {record[key] for record in iter_json_records(file_path, fields=[key]) if key in record}
+
+    pattern = re.compile(rb'"' + re.escape(key.encode('utf-8')) + rb'"\s*:\s*(-?\d+|"(?:[^"\\]|\\.)*")')
+    keys = set()
+    with open(file_path, 'rb') as f:
+        for line_num, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            if not line.endswith(b'\n'):
+                # A record torn by a crash is not done yet
+                logger.warning(f"Skipping incomplete last line {line_num} in {file_path}")
+                continue
+            match = pattern.search(line)
+            if match:
+                keys.add(json.loads(match.group(1)))
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning(f"Skipping unreadable line {line_num} in {file_path}")
+                continue
+            if key in record:
+                keys.add(record[key])
+    return keys
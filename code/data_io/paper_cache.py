@@ -0,0 +1,194 @@
+import json
+import logging
+import os
+import sqlite3
+import time
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# Set PAPER_CACHE_PATH to an empty string to disable caching
+DEFAULT_CACHE_PATH = os.getenv("PAPER_CACHE_PATH", "paper_cache.sqlite")
+DEFAULT_MAX_BYTES = int(os.getenv("PAPER_CACHE_MAX_BYTES", str(8 * 1024 ** 3)))
+# Seconds after which a cached paper is fetched again; 0 keeps papers forever
+DEFAULT_TTL = float(os.getenv("PAPER_CACHE_TTL", str(180 * 24 * 3600)))
+
+
+def _compress(data: bytes):
+    if zstandard is not None:
+        return 'zstd', zstandard.ZstdCompressor(level=3).compress(data)
+    return 'zlib', zlib.compress(data, 6)
+
+
+def _decompress(codec: str, blob: bytes) -> bytes:
+    if codec == 'zstd':
+        if zstandard is None:
+            raise ValueError("entry is zstd-compressed but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(blob)
+    return zlib.decompress(blob)
+
+
+class PaperCache:
+    """
+    Persistent paper cache backed by SQLite, keyed by corpusId.
+
+    Papers are stored as compressed JSON (zstd when the zstandard package is installed,
+    zlib otherwise; the codec is kept per entry). Entries older than `ttl` seconds are
+    treated as missing and deleted, and least-recently-used entries are evicted once the
+    stored papers exceed `max_bytes`.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_bytes: int = DEFAULT_MAX_BYTES, ttl: float = DEFAULT_TTL):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS papers ("
+            "corpus_id INTEGER PRIMARY KEY, codec TEXT NOT NULL, data BLOB NOT NULL, size INTEGER NOT NULL, "
+            "fetched_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS papers_last_access ON papers (last_access)")
+        # Stored size kept by triggers, so it is exact for every process sharing the file
+        self._conn.execute("CREATE TABLE IF NOT EXISTS cache_size (id INTEGER PRIMARY KEY CHECK (id = 0), bytes INTEGER NOT NULL)")
+        self._conn.execute("INSERT OR IGNORE INTO cache_size VALUES (0, (SELECT COALESCE(SUM(size), 0) FROM papers))")
+        self._conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS papers_insert AFTER INSERT ON papers "
+            "BEGIN UPDATE cache_size SET bytes = bytes + NEW.size; END"
+        )
+        self._conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS papers_delete AFTER DELETE ON papers "
+            "BEGIN UPDATE cache_size SET bytes = bytes - OLD.size; END"
+        )
+        self._conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS papers_update AFTER UPDATE OF size ON papers "
+            "BEGIN UPDATE cache_size SET bytes = bytes + NEW.size - OLD.size; END"
+        )
+        self._total_bytes = self._stored_bytes()
+
+    def _is_fresh(self, fetched_at: float, now: float) -> bool:
+        return not self.ttl or now - fetched_at <= self.ttl
+
+    def get_many(self, corpus_ids) -> dict:
+        """Returns {corpusId: paper} for the ids that are cached and not expired."""
+        corpus_ids = list(dict.fromkeys(int(corpus_id) for corpus_id in corpus_ids))
+        now = time.time()
+        found = {}
+        expired = []
+        # Stay below SQLite's limit on bound parameters
+        for start in range(0, len(corpus_ids), 500):
+            chunk = corpus_ids[start:start + 500]
+            rows = self._conn.execute(
+                f"SELECT corpus_id, codec, data, fetched_at FROM papers WHERE corpus_id IN ({','.join('?' * len(chunk))})",
+                chunk
+            )
+            for corpus_id, codec, data, fetched_at in rows:
+                if not self._is_fresh(fetched_at, now):
+                    expired.append((corpus_id,))
+                    continue
+                try:
+                    found[corpus_id] = json.loads(_decompress(codec, data))
+                except (ValueError, zlib.error) as e:
+                    logger.warning(f"Unreadable cached paper {corpus_id}: {e}")
+        if found:
+            self._conn.executemany(
+                "UPDATE papers SET last_access = ? WHERE corpus_id = ?", [(now, corpus_id) for corpus_id in found]
+            )
+        if expired:
+            self._conn.executemany("DELETE FROM papers WHERE corpus_id = ?", expired)
+            self.expired += len(expired)
+        self.hits += len(found)
+        self.misses += len(corpus_ids) - len(found)
+        return found
+
+    def get(self, corpus_id):
+        """Returns the cached paper, or None if it is missing or expired."""
+        return self.get_many([corpus_id]).get(int(corpus_id))
+
+    def put_many(self, papers: dict):
+        """Stores {corpusId: paper}, replacing existing entries."""
+        now = time.time()
+        rows = []
+        for corpus_id, paper in papers.items():
+            codec, data = _compress(json.dumps(paper, ensure_ascii=False).encode('utf-8'))
+            rows.append((int(corpus_id), codec, data, len(data), now, now))
+        if not rows:
+            return
+        # An upsert rather than INSERT OR REPLACE, whose implicit delete skips the triggers
+        self._conn.execute("BEGIN")
+        self._conn.executemany(
+            "INSERT INTO papers (corpus_id, codec, data, size, fetched_at, last_access) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (corpus_id) DO UPDATE SET codec = excluded.codec, data = excluded.data, size = excluded.size, "
+            "fetched_at = excluded.fetched_at, last_access = excluded.last_access",
+            rows
+        )
+        self._conn.execute("COMMIT")
+        self._total_bytes = self._stored_bytes()
+        if self._total_bytes > self.max_bytes:
+            self._evict()
+
+    def _stored_bytes(self) -> int:
+        return self._conn.execute("SELECT bytes FROM cache_size").fetchone()[0]
+
+    def put(self, corpus_id, paper: dict):
+        self.put_many({corpus_id: paper})
+
+    def _evict(self):
+        """
+        Drops expired entries, then least-recently-used ones until the cache is back under
+        90% of max_bytes. Runs in one write transaction, with the stored size recomputed
+        from the entries, so processes sharing the file do not evict against stale totals.
+        """
+        self._conn.execute("BEGIN IMMEDIATE")
+        if self.ttl:
+            purged = self._conn.execute("DELETE FROM papers WHERE fetched_at < ?", (time.time() - self.ttl,)).rowcount
+            self.expired += max(purged, 0)
+        self._conn.execute("UPDATE cache_size SET bytes = (SELECT COALESCE(SUM(size), 0) FROM papers)")
+        self._total_bytes = self._stored_bytes()
+        target = self.max_bytes * 0.9
+        to_delete = []
+        if self._total_bytes > target:
+            for corpus_id, size in self._conn.execute("SELECT corpus_id, size FROM papers ORDER BY last_access").fetchall():
+                if self._total_bytes <= target:
+                    break
+                to_delete.append((corpus_id,))
+                self._total_bytes -= size
+            self._conn.executemany("DELETE FROM papers WHERE corpus_id = ?", to_delete)
+        self._conn.execute("COMMIT")
+        self.evictions += len(to_delete)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "bytes": self._stored_bytes()
+        }
+
+    def close(self):
+        self._conn.close()
+
+
+_cache = None
+
+
+def get_paper_cache():
+    """Returns the process-wide paper cache, or None if caching is disabled."""
+    global _cache
+    if _cache is None and DEFAULT_CACHE_PATH:
+        _cache = PaperCache(DEFAULT_CACHE_PATH)
+    return _cache
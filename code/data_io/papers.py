@@ -0,0 +1,259 @@
+import json
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+# Size of the blocks read from disk while scanning a JSON array for record boundaries
+SCAN_CHUNK_SIZE = 1 << 20
+# An array element still undecodable past this many characters is treated as malformed
+MAX_ELEMENT_SIZE = 64 << 20
+# Where one record object ends and the next begins; used to skip a malformed element
+ELEMENT_BOUNDARY = re.compile(r'\}\s*,\s*(?=\{)')
+# Characters kept from the end of a skipped stretch, in case a boundary spans two reads
+BOUNDARY_TAIL = 1024
+
+
+def get_corpus_id(item: dict):
+    """Returns the corpusId of a raw paper record as an int, or None if it has none."""
+    corpus_id = item.get("corpusID") or item.get("corpusId")
+    if corpus_id is None:
+        return None
+    return int(corpus_id)
+
+
+# Paper fields and the raw dataset keys they are read from
+PAPER_FIELDS = {
+    "title": "title",
+    "field": "fields",
+    "year": "year",
+    "abstract": "abstract",
+    "contents": "contents"
+}
+
+
+def normalize_paper(item: dict, fields=None) -> dict:
+    """Converts a raw dataset record into the paper dict used by the extraction pipeline."""
+    paper = {}
+    if fields is None or "corpusId" in fields:
+        paper["corpusId"] = get_corpus_id(item)
+    for field, key in PAPER_FIELDS.items():
+        if fields is None or field in fields:
+            value = item.get(key)
+            paper[field] = value if isinstance(value, str) else str(value)
+    return paper
+
+
+def _is_json_array(file_path: str) -> bool:
+    """Checks whether the file holds a single JSON array (as opposed to JSON lines)."""
+    with open(file_path, 'rb') as f:
+        while True:
+            chunk = f.read(4096)
+            if not chunk:
+                return False
+            stripped = chunk.lstrip()
+            if stripped:
+                return stripped[:1] == b'['
+
+
+def _scan_jsonl(file_path: str):
+    """Yields (offset, length, record) for every parsable line of a JSONL file."""
+    offset = 0
+    with open(file_path, 'rb') as f:
+        for line_num, line in enumerate(f, 1):
+            length = len(line)
+            if line.strip():
+                try:
+                    yield offset, length, json.loads(line)
+                except json.JSONDecodeError as e:
+                    logger.error(f"JSONDecodeError at line {line_num}: {e}")
+            offset += length
+
+
+def _iter_array_elements(f, chunk_size: int = SCAN_CHUNK_SIZE, max_element_size: int = MAX_ELEMENT_SIZE):
+    """
+    Incrementally parses the elements of a top-level JSON array from an open text file.
+
+    Yields (offset, length, element) where offset and length are in characters. An
+    element that does not decode within `max_element_size` characters (or by the end
+    of the file) is logged and skipped up to the start of the next record object.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    base = 0  # File offset of buffer[0]
+    pos = 0
+    eof = False
+    started = False
+    skip_start = None  # File offset of the malformed element being skipped
+    while True:
+        if skip_start is not None:
+            boundary = ELEMENT_BOUNDARY.search(buffer, pos)
+            if boundary is not None:
+                logger.error(f"Skipping malformed JSON array element at offset {skip_start} "
+                             f"({base + boundary.end() - skip_start} characters)")
+                pos = boundary.end()
+                skip_start = None
+            elif eof:
+                logger.error(f"Truncated or malformed JSON array element at offset {skip_start}, the last in the file")
+                return
+            else:
+                # Drop the skipped text, keeping a tail a boundary may start in
+                keep = min(len(buffer) - pos, BOUNDARY_TAIL)
+                base += len(buffer) - keep
+                buffer = buffer[len(buffer) - keep:]
+                pos = 0
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer += chunk
+                continue
+        # Skip whitespace, the opening bracket and separators between elements
+        while pos < len(buffer) and (buffer[pos] in ' \t\r\n,' or (not started and buffer[pos] == '[')):
+            started = started or buffer[pos] == '['
+            pos += 1
+        if pos < len(buffer) and buffer[pos] == ']':
+            return
+        try:
+            if pos >= len(buffer):
+                raise ValueError("buffer exhausted")
+            element, end = decoder.raw_decode(buffer, pos)
+        except ValueError:
+            if eof and not buffer[pos:].strip():
+                return
+            if eof or len(buffer) - pos > max_element_size:
+                skip_start = base + pos
+                pos += 1
+                continue
+            # Drop what was consumed and pull in more of the file; reading at least the
+            # buffer size keeps an element larger than chunk_size from being re-parsed
+            # once per chunk
+            buffer = buffer[pos:]
+            base += pos
+            pos = 0
+            chunk = f.read(max(chunk_size, len(buffer)))
+            eof = not chunk
+            buffer += chunk
+            continue
+        yield base + pos, end - pos, element
+        pos = end
+
+
+def _scan_json_array(file_path: str, chunk_size: int = SCAN_CHUNK_SIZE):
+    """
+    Yields (offset, length, record) for every element of a top-level JSON array.
+
+    The file is decoded as latin-1 so that character positions are byte positions;
+    records parsed here are only good for reading ASCII fields such as the corpusId.
+    """
+    with open(file_path, 'r', encoding='latin-1') as f:
+        yield from _iter_array_elements(f, chunk_size)
+
+
+def scan_records(file_path: str):
+    """Yields (offset, length, record) for each record of a JSON array or JSONL file."""
+    if _is_json_array(file_path):
+        return _scan_json_array(file_path)
+    return _scan_jsonl(file_path)
+
+
+def _project(record: dict, fields) -> dict:
+    if fields is None:
+        return record
+    return {field: record[field] for field in fields if field in record}
+
+
+def iter_json_records(file_path: str, fields=None):
+    """
+    Streams the records of a JSON array or JSONL file one at a time.
+
+    Args:
+        file_path (str): Path to a .json file holding an array, or a JSON lines file.
+        fields (list, optional): Keys to keep from each record; all keys are kept if None.
+    """
+    if not _is_json_array(file_path):
+        for _, _, record in _scan_jsonl(file_path):
+            yield _project(record, fields)
+        return
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for _, _, record in _iter_array_elements(f):
+            yield _project(record, fields)
+
+
+def iter_papers(file_path: str, fields=None):
+    """
+    Streams papers from the dataset in constant memory.
+
+    Args:
+        file_path (str): Path to the dataset (JSON array or JSONL).
+        fields (list, optional): Paper fields to keep, e.g. ["corpusId", "title"].
+            Fields that are not requested are never converted or copied.
+    """
+    for item in iter_json_records(file_path):
+        if get_corpus_id(item) is None:
+            continue
+        yield normalize_paper(item, fields)
+
+
+class PaperStore:
+    """
+    Paper lookup keyed by corpusId.
+
+    Use PaperStore.load() to hold every paper in memory, or PaperStore.open() to keep
+    only an offset index of the dataset and read papers from disk on demand.
+    """
+
+    def __init__(self, papers=None, file_path=None, offsets=None):
+        self._papers = papers
+        self._file_path = file_path
+        self._offsets = offsets
+
+    @classmethod
+    def load(cls, file_path: str) -> "PaperStore":
+        """Reads every paper of the dataset into memory."""
+        papers = {paper["corpusId"]: paper for paper in iter_papers(file_path)}
+        logger.info(f"Loaded {len(papers)} papers from {file_path}")
+        return cls(papers=papers)
+
+    @classmethod
+    def open(cls, file_path: str) -> "PaperStore":
+        """Builds an index of byte offsets; papers are parsed only when looked up."""
+        offsets = {}
+        for offset, length, record in scan_records(file_path):
+            corpus_id = get_corpus_id(record)
+            if corpus_id is not None:
+                offsets[corpus_id] = (offset, length)
+        logger.info(f"Indexed {len(offsets)} papers in {file_path}")
+        return cls(file_path=file_path, offsets=offsets)
+
+    @property
+    def lazy(self) -> bool:
+        return self._papers is None
+
+    def ids(self) -> list:
+        """Returns the corpusIds in dataset order."""
+        if self.lazy:
+            return list(self._offsets)
+        return list(self._papers)
+
+    def get(self, corpus_id):
+        """Returns the paper with the given corpusId, or None if it is not in the dataset."""
+        corpus_id = int(corpus_id)
+        if not self.lazy:
+            return self._papers.get(corpus_id)
+        location = self._offsets.get(corpus_id)
+        if location is None:
+            return None
+        offset, length = location
+        with open(self._file_path, 'rb') as f:
+            f.seek(offset)
+            return normalize_paper(json.loads(f.read(length)))
+
+    def __contains__(self, corpus_id) -> bool:
+        corpus_id = int(corpus_id)
+        if self.lazy:
+            return corpus_id in self._offsets
+        return corpus_id in self._papers
+
+    def __len__(self) -> int:
+        if self.lazy:
+            return len(self._offsets)
+        return len(self._papers)
@@ -0,0 +1,91 @@
+"""Token-budget batching for the comparison prompts.
+
+Instead of a fixed number of citances/claims per prompt, items are packed with
+first-fit-decreasing so each prompt (plus the answer it asks for) stays within a
+token budget: short items share fewer, fuller requests and long items no longer
+overflow the context.
+"""
+import logging
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from llm.tokens import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Rough per-pair answer sizes: "[3, 7]" in compact prompts, {"citance": 1, "claim": 3, "dm": 7}
+# in pair-score prompts; text prompts echo the candidate text plus these keys
+NUMBER_TOKENS = 2
+COMPACT_PAIR_ANSWER_TOKENS = 4
+SCORES_PAIR_ANSWER_TOKENS = 16
+TEXT_PAIR_ANSWER_TOKENS = 8
+
+
+def first_fit_decreasing(sizes: list, capacity: float) -> list:
+    """
+    Packs items into bins of `capacity`, largest first, each into the first bin with room.
+    Returns the bins as sorted lists of item indices; an item larger than the capacity
+    gets a bin of its own.
+    """
+    bins = []
+    loads = []
+    for idx in sorted(range(len(sizes)), key=lambda i: -sizes[i]):
+        for b, load in enumerate(loads):
+            if load + sizes[idx] <= capacity:
+                bins[b].append(idx)
+                loads[b] += sizes[idx]
+                break
+        else:
+            bins.append([idx])
+            loads.append(sizes[idx])
+    return [sorted(b) for b in bins]
+
+
+def pack_comparison_batches(query_texts: list, candidate_texts: list, candidates: list, token_budget: int,
+                            fixed_tokens: int, numbered: bool = True, shared_candidates: bool = False,
+                            pair_answer_tokens: int = COMPACT_PAIR_ANSWER_TOKENS, fallback_batch_size: int = 1) -> list:
+    """
+    Groups query indices into batches whose estimated prompt and answer tokens fit `token_budget`.
+
+    Args:
+        query_texts (list): Texts of the items batched per prompt (citances or claims).
+        candidate_texts (list): Texts of the items they are scored against.
+        candidates (list): For each query, the indices of its candidates.
+        token_budget (int): Target tokens per request, prompt and answer together.
+        fixed_tokens (int): Tokens of the instruction every prompt carries.
+        numbered (bool): Candidates are numbered once per prompt and answered by number
+            (compact and pair-score prompts); otherwise each query repeats and the answer
+            echoes its candidate texts.
+        shared_candidates (bool): Every query uses every candidate, so a numbered prompt
+            lists them all once; their tokens then count as fixed.
+        pair_answer_tokens (int): Answer tokens per judged pair in numbered prompts.
+        fallback_batch_size (int): Queries per batch when the fixed part of the prompt
+            (instruction, shared candidates) alone exceeds `token_budget`.
+
+    Returns:
+        list: Batches as lists of query indices.
+    """
+    candidate_tokens = [estimate_tokens(text) for text in candidate_texts]
+    if numbered and shared_candidates:
+        fixed_tokens += sum(tokens + NUMBER_TOKENS for tokens in candidate_tokens)
+    if fixed_tokens >= token_budget:
+        # Packing would put every query in its own request, each repeating the fixed part
+        logger.warning(f"Fixed prompt part (~{fixed_tokens} tokens) exceeds the token budget of {token_budget}; "
+                       f"falling back to batches of {fallback_batch_size}")
+        return [list(range(i, min(i + fallback_batch_size, len(query_texts))))
+                for i in range(0, len(query_texts), fallback_batch_size)]
+
+    sizes = []
+    for query_text, candidate_list in zip(query_texts, candidates):
+        size = estimate_tokens(query_text) + NUMBER_TOKENS
+        if numbered:
+            size += (NUMBER_TOKENS + pair_answer_tokens) * len(candidate_list)
+            if not shared_candidates:
+                # Upper bound: candidates shared with other queries of the batch are listed once
+                size += sum(candidate_tokens[j] + NUMBER_TOKENS for j in candidate_list)
+        else:
+            size += sum(2 * candidate_tokens[j] + TEXT_PAIR_ANSWER_TOKENS for j in candidate_list)
+        sizes.append(size)
+    return first_fit_decreasing(sizes, token_budget - fixed_tokens)
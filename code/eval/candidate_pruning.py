@@ -0,0 +1,139 @@
+"""CPU-only TF-IDF pre-filter for the LLM matching stage.
+
+Instead of sending every claim with every citance (and vice versa), each item is
+sent only with its top-k most similar candidates. Run this file directly on an
+existing eval cache to see how much recall of judged matches each k keeps and
+how many pairs it sends:
+
+    python eval/candidate_pruning.py --cache_file eval_cache_filtered.jsonl --top_k 3 5 10
+"""
+import argparse
+import math
+import os
+import sys
+import re
+from collections import Counter
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from data_io.eval_cache import load_eval_cache
+
+TOKEN = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "of", "to", "in", "on", "for", "with", "by", "from", "as", "at",
+    "is", "are", "was", "were", "be", "been", "that", "this", "these", "those", "it", "its", "their",
+    "our", "we", "can", "which", "than", "such", "into", "using", "used", "based", "work", "prior",
+    "works", "paper", "current"
+}
+
+
+def tokenize(text: str) -> list:
+    """Lowercased word unigrams and bigrams without stopwords."""
+    words = [word for word in TOKEN.findall(str(text).lower()) if word not in STOPWORDS]
+    return words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+
+
+class TfidfIndex:
+    """Smoothed TF-IDF vectors fitted on one corpus' claims and citances."""
+
+    def __init__(self, documents):
+        document_frequency = Counter()
+        for document in documents:
+            document_frequency.update(set(tokenize(document)))
+        total = len(documents)
+        self.idf = {term: math.log((1 + total) / (1 + count)) + 1 for term, count in document_frequency.items()}
+
+    def vector(self, text: str) -> dict:
+        counts = Counter(tokenize(text))
+        weights = {term: (1 + math.log(count)) * self.idf.get(term, 1.0) for term, count in counts.items()}
+        norm = math.sqrt(sum(weight * weight for weight in weights.values())) or 1.0
+        return {term: weight / norm for term, weight in weights.items()}
+
+
+def cosine(vector_a: dict, vector_b: dict) -> float:
+    if len(vector_a) > len(vector_b):
+        vector_a, vector_b = vector_b, vector_a
+    return sum(weight * vector_b.get(term, 0.0) for term, weight in vector_a.items())
+
+
+def top_k_candidates(queries: list, candidates: list, top_k: int) -> list:
+    """
+    For each query text, returns the indices of its `top_k` most similar candidate
+    texts, best first. Ties keep the original candidate order.
+    """
+    if top_k is None or top_k >= len(candidates):
+        return [list(range(len(candidates))) for _ in queries]
+    index = TfidfIndex(list(queries) + list(candidates))
+    candidate_vectors = [index.vector(text) for text in candidates]
+    selections = []
+    for query in queries:
+        query_vector = index.vector(query)
+        scores = [cosine(query_vector, candidate_vector) for candidate_vector in candidate_vectors]
+        ranked = sorted(range(len(candidates)), key=lambda idx: -scores[idx])
+        selections.append(ranked[:top_k])
+    return selections
+
+
+def pruning_report(cache_data: dict, top_ks: list, dm_threshold: float) -> list:
+    """
+    Measures, per k, the share of judged matches (dm >= dm_threshold) whose pair the
+    pre-filter keeps, and the share of pairs (judge work) it sends.
+    """
+    report = []
+    for top_k in top_ks:
+        kept_pairs = total_pairs = 0
+        kept_positives = total_positives = 0
+        for data in cache_data.values():
+            citance_texts = [citance['citance'] for citance in data.get('citances', [])]
+            claim_texts = [claim['claim'] for claim in data.get('claims', [])]
+            if not citance_texts or not claim_texts:
+                continue
+            views = [
+                ('citance_to_claims', citance_texts, claim_texts,
+                 lambda match: (match.get('citance'), match['claim'].get('claim'))),
+                ('claim_to_citances', claim_texts, citance_texts,
+                 lambda match: (match['claim'].get('claim'), match.get('citance'))),
+            ]
+            for view, queries, candidates, pair_of in views:
+                selections = top_k_candidates(queries, candidates, top_k)
+                kept = {(queries[i], candidates[j]) for i, selected in enumerate(selections) for j in selected}
+                kept_pairs += len(kept)
+                total_pairs += len(queries) * len(candidates)
+                for match in data.get('matches', {}).get(view, []):
+                    if match.get('dm_score', 0) < dm_threshold:
+                        continue
+                    total_positives += 1
+                    if pair_of(match) in kept:
+                        kept_positives += 1
+        report.append({
+            'top_k': top_k,
+            'recall': kept_positives / total_positives if total_positives else None,
+            'pair_fraction': kept_pairs / total_pairs if total_pairs else None,
+            'positives': total_positives,
+            'pairs_sent': kept_pairs,
+            'pairs_total': total_pairs
+        })
+    return report
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Recall-vs-cost report of the TF-IDF candidate pre-filter on an eval cache.")
+    parser.add_argument('--cache_file', type=str, default="eval_cache_filtered.jsonl", help="Path to the eval cache (per-corpus JSONL store or legacy JSON).")
+    parser.add_argument('--top_k', type=int, nargs='+', default=[1, 3, 5, 10, 20], help="Candidate counts to evaluate.")
+    parser.add_argument('--threshold', type=float, default=6, help="dm_score at or above which a judged pair counts as a match.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    cache_data = load_eval_cache(args.cache_file)
+    print(f"{'top_k':>6} {'recall':>8} {'pairs sent':>11}")
+    for row in pruning_report(cache_data, args.top_k, args.threshold):
+        recall = f"{row['recall']:.3f}" if row['recall'] is not None else "n/a"
+        fraction = f"{row['pair_fraction']:.3f}" if row['pair_fraction'] is not None else "n/a"
+        print(f"{row['top_k']:>6} {recall:>8} {fraction:>11}")
+
+
+if __name__ == "__main__":
+    main()
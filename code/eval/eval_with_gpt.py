@@ -1,68 +1,85 @@
 
-import json
 import os
 import argparse
 import asyncio
+import random
 import time
+from collections import Counter
 from tqdm import tqdm
 import sys
-import re
 import aiohttp
 
 
 # Append the parent directory to the system path for imports
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+from prompts.comparison_prompts import (
+    claim_to_citances_prompt, citance_to_claims_prompt, citance_claim_scores_prompt,
+    citance_to_claims_compact_prompt, claim_to_citances_compact_prompt
+)
+from data_io.papers import iter_json_records
+from data_io.jsonl_sink import JsonlSink, read_record_keys
+from data_io.eval_cache import EVAL_CACHE_KEY, eval_cache_record
+from llm.backend import DEFAULT_BASE_URL, get_backend
+from eval.candidate_pruning import top_k_candidates
+from eval.batch_packing import SCORES_PAIR_ANSWER_TOKENS, pack_comparison_batches
+from llm.tokens import estimate_tokens
+from pipeline.fair_scheduler import FairScheduler
+from pipeline.worker_pool import imap_unordered
+from llm.response_cache import get_response_cache
+from llm.parsing import is_parseable, parse_json_tiered
 
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
-from prompts.comparison_prompts import claim_to_citances_prompt, citance_to_claims_prompt
+# Retries of a failed request (full-jitter exponential backoff, in seconds)
+MAX_REQUEST_RETRIES = 4
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 30.0
+# How many times pairs left unscored by a response are resubmitted in smaller batches
+MAX_SALVAGE_DEPTH = 2
 
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+# Prompts sent and their estimated tokens, for the throughput report at the end of a run
+request_stats = Counter()
 
-def parse_args():
+def parse_args(argv=None):
     parser = argparse.ArgumentParser(description="Collect matches between claims and citances using OpenAI API.")
     parser.add_argument('--citances', type=str, default="test_citances.json", help="Path to the citances JSON file.")
     parser.add_argument('--claims', type=str, default="extarcted_claims", help="Path to the claims JSON file.")
     parser.add_argument('--output_dir', type=str, default=".", help="Directory to save the output JSON files.")
+    parser.add_argument('--cache_file', type=str, default="eval_cache_filtered.jsonl", help="Per-corpus JSONL results store inside output_dir; corpora already in it are skipped.")
     parser.add_argument('--openai_api_key', type=str, default=OPENAI_API_KEY, help="OpenAI API key.")
+    parser.add_argument('--base_url', type=str, default=DEFAULT_BASE_URL, help="Base URL of the OpenAI-compatible API (e.g. a local mock server).")
     parser.add_argument('--batch_size', type=int, default=5, help="Number of items per batch to send to OpenAI API.")
+    parser.add_argument('--token_budget', type=int, default=None, help="Pack each comparison prompt up to this many estimated tokens (prompt and answer) instead of --batch_size items.")
     parser.add_argument('--max_concurrent_requests', type=int, default=200, help="Maximum number of concurrent API requests.")
-    return parser.parse_args()
+    parser.add_argument('--max_active_corpora', type=int, default=32, help="Number of corpora processed at once; their requests share the concurrency limit round-robin.")
+    parser.add_argument('--symmetric', action='store_true', help="Score each citance-claim pair once and derive both match directions from it.")
+    parser.add_argument('--prompt_format', type=str, choices=['compact', 'text'], default='text', help="text (default, the original prompts): candidate texts repeated per item and echoed back; compact: candidates numbered once per prompt, answers as [number, dm] pairs. Compact prompts are cheaper, but their scores are not comparable with text-prompt runs and a judge fine-tuned on text prompts may not follow them.")
+    parser.add_argument('--prefilter_top_k', type=int, default=None, help="Send each citance/claim only with its top-k TF-IDF candidates (default: all).")
+    return parser.parse_args(argv)
 
 
 
 
-async def get_one_completion_async(prompt, session, api_key, model, temperature=0.0):
+async def get_one_completion_async(prompt, session, api_key, model, temperature=0.0, base_url=None, on_send=None):
     start_time = time.perf_counter()
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {api_key}"
-    }
-    async with session.post(
-        "https://api.openai.com/v1/chat/completions",
-        headers=headers,
-        json={
-            "model": model,
-            "messages": [{"role": "user", "content": prompt}],
-            "temperature": temperature
-        }
-    ) as resp:
-        if resp.status != 200:
-            response_text = await resp.text()
-            raise Exception(f"API call failed with status {resp.status}: {response_text}")
-        response_json = await resp.json()
+    backend = get_backend(base_url, api_key)
+    response_text = await backend.complete(
+        session,
+        [{"role": "user", "content": prompt}],
+        model=model,
+        temperature=temperature,
+        validate=is_parseable,
+        on_send=on_send
+    )
     end_time = time.perf_counter()
     elapsed_time = end_time - start_time
     print(f"Request took {elapsed_time:.2f} seconds.")
-    return response_json["choices"][0]['message']["content"]
-
-
-def sanitize_response(response_text):
-    # Remove code fences and language specifiers
-    response_text = response_text.strip()
-    response_text = re.sub(r'^```[a-zA-Z]*\n', '', response_text)
-    response_text = re.sub(r'\n```$', '', response_text)
     return response_text
 
+
 def extract_claims_citances(data_citances, data_claims):
     """
     Extract claims and citances grouped by corpusId.
@@ -86,9 +103,160 @@ def extract_claims_citances(data_citances, data_claims):
     return claims_citances
 
 
-async def limited_get_one_completion(prompt, session, sem, api_key, model, temperature=0.0):
+async def limited_get_one_completion(prompt, session, sem, api_key, model, temperature=0.0, base_url=None, on_send=None):
     async with sem:
-        return await get_one_completion_async(prompt, session, api_key, model, temperature)
+        return await get_one_completion_async(prompt, session, api_key, model, temperature, base_url, on_send)
+
+async def request_with_backoff(prompt, session, sem, api_key, model, base_url=None, retries=MAX_REQUEST_RETRIES, on_send=None):
+    """
+    Sends one prompt, retrying failed requests (5xx, timeouts, exhausted 429 retries)
+    with full-jitter exponential backoff. Returns None once every attempt has failed.
+    The backoff sleep happens outside the semaphore so waiting requests hold no slot.
+    """
+    for attempt in range(retries):
+        try:
+            return await limited_get_one_completion(prompt, session, sem, api_key, model, base_url=base_url, on_send=on_send)
+        except Exception as e:
+            if attempt == retries - 1:
+                print(f"Request failed after {retries} attempts: {e}")
+                return None
+            delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+            print(f"Request failed ({e}); retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+def read_directional_scores(response_data, key, query_field, candidate_field, items, query_texts, candidate_texts):
+    """
+    Reads a citance_to_claims / claim_to_citances response into {(query, candidate): dm}
+    for the pairs requested in `items`. Texts the model altered match no pair and stay missing.
+    """
+    items_by_text = {}
+    for query, candidates in items:
+        items_by_text.setdefault(query_texts[query], []).append((query, candidates))
+
+    scores = {}
+    for entry in response_data.get(key, []):
+        for query, candidates in items_by_text.get(entry.get(query_field), []):
+            candidates_by_text = {}
+            for candidate in candidates:
+                candidates_by_text.setdefault(candidate_texts[candidate], []).append(candidate)
+            for match in entry.get('matches', []):
+                for candidate in candidates_by_text.get(match.get(candidate_field), []):
+                    scores[(query, candidate)] = float(match.get('dm', 0))
+    return scores
+
+def number_candidates(items, explicit=False):
+    """
+    Numbers the candidates a batch needs once, for the numbered prompts.
+
+    Returns the candidate indices in prompt order and, for each item, its candidates as
+    0-based prompt positions; the latter is None when every item uses every numbered
+    candidate and `explicit` is False (the prompt then omits the per-item lists).
+    """
+    candidate_indices = sorted({j for _, candidates in items for j in candidates})
+    local_index = {j: local for local, j in enumerate(candidate_indices)}
+    batch_candidates = None
+    if explicit or any(len(candidates) < len(candidate_indices) for _, candidates in items):
+        batch_candidates = [[local_index[j] for j in candidates] for _, candidates in items]
+    return candidate_indices, batch_candidates
+
+def read_numbered_scores(response_data, key, query_field, candidate_field, items, candidate_indices):
+    """
+    Reads a compact citance_to_claims / claim_to_citances response, where queries and
+    candidates are referred to by prompt number, into {(query, candidate): dm}.
+    """
+    requested = {(query, candidate) for query, candidates in items for candidate in candidates}
+    scores = {}
+    for entry in response_data.get(key, []):
+        query_number = int(entry.get(query_field, 0))
+        if not 1 <= query_number <= len(items):
+            continue
+        query = items[query_number - 1][0]
+        for match in entry.get('matches', []):
+            if isinstance(match, dict):
+                candidate_number, dm = match.get(candidate_field, 0), match.get('dm', 0)
+            elif isinstance(match, (list, tuple)) and len(match) >= 2:
+                candidate_number, dm = match[0], match[1]
+            else:
+                continue
+            candidate_number = int(candidate_number)
+            if not 1 <= candidate_number <= len(candidate_indices):
+                continue
+            pair = (query, candidate_indices[candidate_number - 1])
+            if pair in requested:
+                scores[pair] = float(dm)
+    return scores
+
+async def judge_pairs(items, build_request, session, sem, api_key, model, base_url=None, depth=0):
+    """
+    Judges one batch of (query index, candidate indices) items and returns {(query, candidate): dm}.
+
+    `build_request(items)` returns the prompt and a function reading the parsed response
+    into scores. Pairs left unscored (failed request, unparseable answer, items the model
+    skipped) are resubmitted alone in half-size batches, up to MAX_SALVAGE_DEPTH times,
+    so one bad response no longer discards every pair it carried.
+    """
+    prompt, read_scores = build_request(items)
+    # Counted as sent only if it reached the API; cache hits are counted apart
+    sent = []
+    response_text = await request_with_backoff(prompt, session, sem, api_key, model, base_url,
+                                               on_send=lambda: sent.append(True))
+    if sent:
+        request_stats['prompts'] += 1
+        request_stats['prompt_tokens'] += estimate_tokens(prompt)
+    elif response_text is not None:
+        request_stats['cached_prompts'] += 1
+
+    scores = {}
+    if response_text is not None:
+        response_data = parse_json_tiered(response_text)
+        if response_data is None:
+            print("Error parsing response: no parsing tier succeeded")
+        else:
+            try:
+                scores = read_scores(response_data)
+            except (AttributeError, TypeError, ValueError, IndexError, KeyError) as e:
+                print(f"Error reading response: {e}")
+
+    missing = []
+    for query, candidates in items:
+        unscored = [candidate for candidate in candidates if (query, candidate) not in scores]
+        if unscored:
+            missing.append((query, unscored))
+    if not missing:
+        return scores
+    if depth >= MAX_SALVAGE_DEPTH:
+        print(f"Giving up on {sum(len(candidates) for _, candidates in missing)} unscored pairs")
+        return scores
+
+    half = (len(missing) + 1) // 2
+    salvaged = await asyncio.gather(*[
+        judge_pairs(missing[i:i + half], build_request, session, sem, api_key, model, base_url, depth + 1)
+        for i in range(0, len(missing), half)
+    ])
+    for batch_scores in salvaged:
+        scores.update(batch_scores)
+    return scores
+
+def make_batches(query_texts, candidate_texts, candidates, batch_size, token_budget=None, **packing):
+    """
+    Batches of query indices: consecutive runs of `batch_size`, or with `token_budget`
+    set, first-fit-decreasing packing by estimated tokens (see eval/batch_packing.py).
+    """
+    if token_budget is None:
+        return [list(range(i, min(i + batch_size, len(query_texts)))) for i in range(0, len(query_texts), batch_size)]
+    return pack_comparison_batches(query_texts, candidate_texts, candidates, token_budget,
+                                   fallback_batch_size=batch_size, **packing)
+
+async def judge_in_batches(candidates, batches, build_request, session, sem, api_key, model, base_url=None):
+    """Judges the batches of query indices concurrently and merges the scores."""
+    results = await asyncio.gather(*[
+        judge_pairs([(i, candidates[i]) for i in batch], build_request, session, sem, api_key, model, base_url)
+        for batch in batches
+    ])
+    scores = {}
+    for batch_scores in results:
+        scores.update(batch_scores)
+    return scores
 
 async def collect_citance_to_claims_matches(
     corpusId,
@@ -98,59 +266,59 @@ async def collect_citance_to_claims_matches(
     session,
     sem,
     api_key,
-    model
+    model,
+    base_url=None,
+    top_k=None,
+    compact=True,
+    token_budget=None
 ):
     """
     Collect matches from citances to claims.
+    With top_k set, each citance is judged only against its top_k most similar claims.
+    With compact set, claims are numbered once per prompt and answered by number.
     """
-    all_matches = []
-    claim_text_to_data = {claim_data['claim']: claim_data for claim_data in list_claims}
+    list_citance_texts = [citance['citance'] for citance in list_citances]
     list_claim_texts = [claim_data['claim'] for claim_data in list_claims]
-
-    tasks = []
-    citance_scores = {}  # To hold citance and their scores for mapping later
-    for citance in list_citances:
-        citance_text = citance['citance']
-        citance_scores[citance_text] = citance['score']
-
-    for i in range(0, len(list_citances), batch_size):
-        batch_citances = list_citances[i:i + batch_size]
-        citances_claims_batch = [{'citance': citance['citance'], 'claims': list_claim_texts} for citance in batch_citances]
+    candidates = top_k_candidates(list_citance_texts, list_claim_texts, top_k)
+
+    def build_request(items):
+        if compact:
+            claim_indices, batch_candidates = number_candidates(items, explicit=top_k is not None)
+            prompt = citance_to_claims_compact_prompt(
+                [list_citance_texts[i] for i, _ in items],
+                [list_claim_texts[j] for j in claim_indices],
+                batch_candidates
+            )
+            return prompt, lambda response_data: read_numbered_scores(
+                response_data, 'citance_to_claims', 'citance', 'claim', items, claim_indices
+            )
+        citances_claims_batch = [
+            {'citance': list_citance_texts[i], 'claims': [list_claim_texts[j] for j in claim_indices]}
+            for i, claim_indices in items
+        ]
         prompt = citance_to_claims_prompt(citances_claims_batch)
-        task = limited_get_one_completion(prompt, session, sem, api_key, model)
-        tasks.append(task)
-
-    # Process tasks concurrently
-    responses = await asyncio.gather(*tasks)
+        return prompt, lambda response_data: read_directional_scores(
+            response_data, 'citance_to_claims', 'citance', 'claim', items, list_citance_texts, list_claim_texts
+        )
+
+    batches = make_batches(
+        list_citance_texts, list_claim_texts, candidates, batch_size, token_budget,
+        fixed_tokens=estimate_tokens(citance_to_claims_compact_prompt([], []) if compact else citance_to_claims_prompt([])),
+        numbered=compact, shared_candidates=top_k is None
+    )
+    scores = await judge_in_batches(candidates, batches, build_request, session, sem, api_key, model, base_url)
 
-    # Process responses
-    for response_text in responses:
-        if response_text is None:
-            continue
-        sanitized_response = sanitize_response(response_text)
-        try:
-            response_data = json.loads(sanitized_response)
-            citance_matches_list = response_data.get('citance_to_claims', [])
-
-            for citance_match in citance_matches_list:
-                citance_text = citance_match.get('citance')
-                # We get citance_score from our pre-stored dictionary
-                citance_score = citance_scores.get(citance_text)
-
-                matches = citance_match.get('matches', [])
-                for match in matches:
-                    claim_text = match.get('claim')
-                    dm = float(match.get('dm', 0))
-                    claim_data = claim_text_to_data.get(claim_text, {'claim': claim_text})
-                    all_matches.append({
-                        'citance': citance_text,
-                        'claim': claim_data,
-                        'c_score': citance_score,
-                        'dm_score': dm
-                    })
-        except json.JSONDecodeError as e:
-            print(f"Error parsing response: {e}")
-            continue
+    all_matches = []
+    for i, citance in enumerate(list_citances):
+        for j in candidates[i]:
+            if (i, j) not in scores:
+                continue
+            all_matches.append({
+                'citance': citance['citance'],
+                'claim': list_claims[j],
+                'c_score': citance['score'],
+                'dm_score': scores[(i, j)]
+            })
     return all_matches
 
 async def collect_claim_to_citances_matches(
@@ -161,60 +329,179 @@ async def collect_claim_to_citances_matches(
     session,
     sem,
     api_key,
-    model
+    model,
+    base_url=None,
+    top_k=None,
+    compact=True,
+    token_budget=None
 ):
     """
     Collect matches from claims to citances.
+    With top_k set, each claim is judged only against its top_k most similar citances.
+    With compact set, citances are numbered once per prompt and answered by number.
     """
-    all_matches = []
-    claim_text_to_data = {claim_data['claim']: claim_data for claim_data in list_claims}
     list_citance_texts = [citance['citance'] for citance in list_citances]
-    citance_scores = {citance['citance']: citance['score'] for citance in list_citances}
-
-    tasks = []
-    for i in range(0, len(list_claims), batch_size):
-        batch_claims_data = list_claims[i:i + batch_size]
-        batch_claims_texts = [claim_data['claim'] for claim_data in batch_claims_data]
-        claims_citances_batch = [{'claim': claim_text, 'citances': list_citance_texts} for claim_text in batch_claims_texts]
+    list_claim_texts = [claim_data['claim'] for claim_data in list_claims]
+    candidates = top_k_candidates(list_claim_texts, list_citance_texts, top_k)
+
+    def build_request(items):
+        if compact:
+            citance_indices, batch_candidates = number_candidates(items, explicit=top_k is not None)
+            prompt = claim_to_citances_compact_prompt(
+                [list_claim_texts[j] for j, _ in items],
+                [list_citance_texts[i] for i in citance_indices],
+                batch_candidates
+            )
+            return prompt, lambda response_data: read_numbered_scores(
+                response_data, 'claim_to_citances', 'claim', 'citance', items, citance_indices
+            )
+        claims_citances_batch = [
+            {'claim': list_claim_texts[j], 'citances': [list_citance_texts[i] for i in citance_indices]}
+            for j, citance_indices in items
+        ]
         prompt = claim_to_citances_prompt(claims_citances_batch)
-        task = limited_get_one_completion(prompt, session, sem, api_key, model)
-        tasks.append(task)
-
-    # Process tasks concurrently
-    responses = await asyncio.gather(*tasks)
+        return prompt, lambda response_data: read_directional_scores(
+            response_data, 'claim_to_citances', 'claim', 'citance', items, list_claim_texts, list_citance_texts
+        )
+
+    batches = make_batches(
+        list_claim_texts, list_citance_texts, candidates, batch_size, token_budget,
+        fixed_tokens=estimate_tokens(claim_to_citances_compact_prompt([], []) if compact else claim_to_citances_prompt([])),
+        numbered=compact, shared_candidates=top_k is None
+    )
+    scores = await judge_in_batches(candidates, batches, build_request, session, sem, api_key, model, base_url)
 
-    # Process responses
-    for response_text in responses:
-        if response_text is None:
-            continue
-        sanitized_response = sanitize_response(response_text)
-        try:
-            response_data = json.loads(sanitized_response)
-            claim_matches_list = response_data.get('claim_to_citances', [])
-
-            for claim_match in claim_matches_list:
-                claim_text = claim_match.get('claim')
-                matches = claim_match.get('matches', [])
-                for match in matches:
-                    citance_text = match.get('citance')
-                    citance_score = citance_scores.get(citance_text)
-                    dm = float(match.get('dm', 0))
-                    claim_data = claim_text_to_data.get(claim_text, {'claim': claim_text})
-                    all_matches.append({
-                        'claim': claim_data,
-                        'citance': citance_text,
-                        'c_score': citance_score,
-                        'dm_score': dm
-                    })
-        except json.JSONDecodeError as e:
-            print(f"Error parsing response: {e}")
-            continue
+    all_matches = []
+    for j, claim_data in enumerate(list_claims):
+        for i in candidates[j]:
+            if (j, i) not in scores:
+                continue
+            all_matches.append({
+                'claim': claim_data,
+                'citance': list_citances[i]['citance'],
+                'c_score': list_citances[i]['score'],
+                'dm_score': scores[(j, i)]
+            })
     return all_matches
 
+async def collect_pair_scores(
+    corpusId,
+    list_citances,
+    list_claims,
+    batch_size,
+    session,
+    sem,
+    api_key,
+    model,
+    base_url=None,
+    top_k=None,
+    token_budget=None
+):
+    """
+    Score every (citance, claim) pair once.
+    Returns a dense matrix indexed [citance][claim] holding dm scores (None for unscored pairs).
+    """
+    list_citance_texts = [citance['citance'] for citance in list_citances]
+    list_claim_texts = [claim_data['claim'] for claim_data in list_claims]
+    candidates = top_k_candidates(list_citance_texts, list_claim_texts, top_k)
+
+    def build_request(items):
+        # Number only the claims this batch needs, once per prompt
+        claim_indices, batch_candidates = number_candidates(items, explicit=top_k is not None)
+        prompt = citance_claim_scores_prompt(
+            [list_citance_texts[i] for i, _ in items],
+            [list_claim_texts[j] for j in claim_indices],
+            batch_candidates
+        )
+
+        def read_scores(response_data):
+            requested = {(i, j) for i, claim_list in items for j in claim_list}
+            scores = {}
+            for entry in response_data.get('scores', []):
+                citance_number = int(entry.get('citance', 0))
+                claim_number = int(entry.get('claim', 0))
+                if not (1 <= citance_number <= len(items) and 1 <= claim_number <= len(claim_indices)):
+                    continue
+                pair = (items[citance_number - 1][0], claim_indices[claim_number - 1])
+                if pair in requested:
+                    scores[pair] = float(entry.get('dm', 0))
+            return scores
+
+        return prompt, read_scores
+
+    batches = make_batches(
+        list_citance_texts, list_claim_texts, candidates, batch_size, token_budget,
+        fixed_tokens=estimate_tokens(citance_claim_scores_prompt([], [])),
+        shared_candidates=top_k is None, pair_answer_tokens=SCORES_PAIR_ANSWER_TOKENS
+    )
+    scores = await judge_in_batches(candidates, batches, build_request, session, sem, api_key, model, base_url)
+
+    score_matrix = [[None] * len(list_claims) for _ in list_citances]
+    for (i, j), dm in scores.items():
+        score_matrix[i][j] = dm
+    return score_matrix
+
+def matches_from_score_matrix(list_citances, list_claims, score_matrix):
+    """
+    Derive the citance_to_claims and claim_to_citances match lists from a pair score matrix.
+    """
+    citance_to_claims = []
+    claim_to_citances = []
+    for i, citance in enumerate(list_citances):
+        for j, claim_data in enumerate(list_claims):
+            dm = score_matrix[i][j]
+            if dm is None:
+                continue
+            citance_to_claims.append({
+                'citance': citance['citance'],
+                'claim': claim_data,
+                'c_score': citance['score'],
+                'dm_score': dm
+            })
+    for j, claim_data in enumerate(list_claims):
+        for i, citance in enumerate(list_citances):
+            dm = score_matrix[i][j]
+            if dm is None:
+                continue
+            claim_to_citances.append({
+                'claim': claim_data,
+                'citance': citance['citance'],
+                'c_score': citance['score'],
+                'dm_score': dm
+            })
+    return citance_to_claims, claim_to_citances
+
 async def process_corpus(corpusId, list_citances, list_claims, args, session, sem, api_key, model):
     """
     Process a single corpus: collect matches from citances to claims and from claims to citances.
+    In symmetric mode each pair is scored once and both directions are derived from the score matrix.
     """
+    if args.symmetric:
+        score_matrix = await collect_pair_scores(
+            corpusId,
+            list_citances,
+            list_claims,
+            batch_size=args.batch_size,
+            session=session,
+            sem=sem,
+            api_key=api_key,
+            model=model,
+            base_url=args.base_url,
+            top_k=args.prefilter_top_k,
+            token_budget=args.token_budget
+        )
+        citance_to_claims_matches, claim_to_citances_matches = matches_from_score_matrix(list_citances, list_claims, score_matrix)
+        corpus_data = {
+            'citances': list_citances,
+            'claims': list_claims,
+            'matches': {
+                'citance_to_claims': citance_to_claims_matches,
+                'claim_to_citances': claim_to_citances_matches
+            },
+            'score_matrix': score_matrix
+        }
+        return corpusId, corpus_data
+
     # Create tasks for both functions
     task1 = collect_citance_to_claims_matches(
         corpusId,
@@ -224,7 +511,11 @@ async def process_corpus(corpusId, list_citances, list_claims, args, session, se
         session=session,
         sem=sem,
         api_key=api_key,
-        model=model
+        model=model,
+        base_url=args.base_url,
+        top_k=args.prefilter_top_k,
+        compact=args.prompt_format == 'compact',
+        token_budget=args.token_budget
     )
 
     task2 = collect_claim_to_citances_matches(
@@ -235,7 +526,11 @@ async def process_corpus(corpusId, list_citances, list_claims, args, session, se
         session=session,
         sem=sem,
         api_key=api_key,
-        model=model
+        model=model,
+        base_url=args.base_url,
+        top_k=args.prefilter_top_k,
+        compact=args.prompt_format == 'compact',
+        token_budget=args.token_budget
     )
 
     # Run tasks concurrently
@@ -260,65 +555,79 @@ async def main():
         print("OpenAI API key not provided.")
         return
 
-    # Load citances and claims data
+    # Stream citances and claims data (JSON arrays or JSONL)
     try:
-        with open(args.citances, 'r') as f1, open(args.claims, 'r') as f2:
-            data_citances = json.load(f1)
-            data_claims = json.load(f2)
+        data_citances = iter_json_records(args.citances, fields=['corpusId', 'paper_id', 'citances'])
+        data_claims = iter_json_records(args.claims, fields=['corpusId', 'corpusid', 'claims'])
+
+        # Extract claims and citances grouped by corpusId
+        claims_citances = extract_claims_citances(data_citances, data_claims)
     except Exception as e:
         print(f"Error loading JSON files: {e}")
         return
 
-    # Extract claims and citances grouped by corpusId
-    claims_citances = extract_claims_citances(data_citances, data_claims)
-
     if not claims_citances:
         print("No valid claims and citances found for evaluation.")
         return
 
-    cache_data = {}
-
-    # Initialize semaphore and session
-    sem = asyncio.Semaphore(args.max_concurrent_requests)
+    # Results are appended per corpus as they complete; corpora already stored are not redone
+    output_dir = args.output_dir
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    cache_filename = os.path.join(output_dir, args.cache_file)
+    completed = set()
+    if os.path.exists(cache_filename):
+        completed = {str(corpusId) for corpusId in read_record_keys(cache_filename, EVAL_CACHE_KEY)}
+        print(f"Skipping {len(completed)} corpora already in {cache_filename}")
+
+    # Corpora left to do, smallest first (shortest-job-first) so results are persisted at a steady rate
+    pending = []
+    for corpusId, data in claims_citances.items():
+        if corpusId in completed:
+            continue
+        if not data['citances'] or not data['claims']:
+            print(f"Skipping corpus ID {corpusId} due to empty claims or citances.\n")
+            continue
+        pending.append(corpusId)
+    pending.sort(key=lambda corpusId: len(claims_citances[corpusId]['citances']) * len(claims_citances[corpusId]['claims']))
+
+    # Requests of the active corpora share the slots round-robin, so a huge corpus cannot
+    # starve the small ones; the shared limiter starts at this ceiling and adapts the
+    # number of in-flight requests below it from rate-limit headers and 429s
+    scheduler = FairScheduler(args.max_concurrent_requests)
+    limiter = get_backend(args.base_url, api_key).limiter
+    limiter.max_concurrency = args.max_concurrent_requests
+    limiter.limit = float(args.max_concurrent_requests)
+    start_time = time.perf_counter()
     async with aiohttp.ClientSession() as session:
-        # Create tasks for each corpusId
-        tasks = []
-        for corpusId, data in claims_citances.items():
-            list_citances = data['citances']
-            list_claims = data['claims']
-
-            if not list_citances or not list_claims:
-                print(f"Skipping corpus ID {corpusId} due to empty claims or citances.\n")
-                continue
-
-            task = process_corpus(corpusId, list_citances, list_claims, args, session, sem, api_key, model)
-            tasks.append(task)
-
-        # Process tasks concurrently with a progress bar
-        total_tasks = len(tasks)
-
-        # Create an iterator over futures
-        futures_iterator = asyncio.as_completed(tasks)
-
-        # Wrap the iterator with tqdm for progress bar
-        for future in tqdm(futures_iterator, total=total_tasks, desc="Processing paper IDs"):
-            try:
-                corpusId, corpus_data = await future
-                cache_data[corpusId] = corpus_data
-            except Exception as e:
-                print(f"Error processing corpus: {e}")
-
-        # Save combined results
-        output_dir = args.output_dir
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir)
-        cache_filename = os.path.join(output_dir, 'eval_cache_filtered.json')
-        try:
-            with open(cache_filename, 'w') as f:
-                json.dump(cache_data, f, indent=4)
-            print(f"\nCombined cache data saved to {cache_filename}")
-        except Exception as e:
-            print(f"Error saving combined cache data: {e}")
+        async def run_corpus(corpusId):
+            data = claims_citances[corpusId]
+            return await process_corpus(
+                corpusId, data['citances'], data['claims'], args, session, scheduler.lane(corpusId), api_key, model
+            )
+
+        # Only max_active_corpora corpora (and their batch tasks) exist at a time
+        with JsonlSink(cache_filename) as sink, tqdm(total=len(pending), desc="Processing paper IDs") as progress:
+            async for corpusId, result in imap_unordered(run_corpus, pending, args.max_active_corpora):
+                progress.update(1)
+                if result is None:
+                    print(f"Error processing corpus {corpusId}")
+                    continue
+                corpusId, corpus_data = result
+                sink.write(eval_cache_record(corpusId, corpus_data))
+        print(f"\n{sink.records_written} corpora appended to {cache_filename}")
+
+    # Throughput of the batching: fewer, fuller prompts show up as fewer prompts/sec at more tokens/request
+    elapsed = time.perf_counter() - start_time
+    prompts = request_stats['prompts']
+    if prompts:
+        print(f"Sent {prompts} prompts in {elapsed:.1f}s: {prompts / elapsed:.2f} prompts/sec, "
+              f"{request_stats['prompt_tokens'] / prompts:.0f} estimated prompt tokens/request")
+    if request_stats['cached_prompts']:
+        print(f"{request_stats['cached_prompts']} prompts answered from the response cache")
+
+    if get_response_cache() is not None:
+        print(f"Response cache: {get_response_cache().stats()}")
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
@@ -1,13 +1,30 @@
 
+import csv
 import json
+import logging
 import os
+import sys
 import argparse
+from collections import OrderedDict
+import numpy as np
 from tqdm import tqdm
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from data_io.eval_cache import EVAL_CACHE_KEY, iter_eval_cache
+from data_io.jsonl_sink import JsonlSink
+from eval.metrics_engine import CorpusScores
+
+logger = logging.getLogger(__name__)
+
+# CorpusScores of the corpora most recently passed to calculate_metrics_from_cache
+CORPUS_SCORES_CACHE_SIZE = 128
+_corpus_scores_cache = OrderedDict()
 #E:\claim_extraction_project\scripts\eval\gpt\turbo_eval_cache_filtered.json E:\claim_extraction_project\scripts\eval\gpt\eval_cache_new_filtered.json" E:\claim_extraction_project\scripts\eval\gpt\weakly_last_eval_cache_filtered.json
 #C:\Users\neset\OneDrive\Desktop\claim_extraction\scripts\eval\gpt\new_weakly_eval_cache_filtered.json
 def parse_args():
     parser = argparse.ArgumentParser(description="Calculate coverage and precision metrics from cached data with filtering options.")
-    parser.add_argument('--cache_file', type=str, default="eval_cache_filtered.json", help="Path to the cache JSON file.")
+    parser.add_argument('--cache_file', type=str, default="eval_cache_filtered.jsonl", help="Path to the eval cache (per-corpus JSONL store or legacy JSON).")
     parser.add_argument('--output_dir', type=str, default=r"", help="Directory to save the output JSON files.")
     parser.add_argument('--threshold', type=float, default=6, help="Threshold for degree of match (dm_score).")
     parser.add_argument('--c_score_threshold', type=float, default=8, help="Threshold for c_score.")
@@ -15,9 +32,39 @@ def parse_args():
     parser.add_argument('--theme', type=str, nargs='*',help="Themes to include (case-insensitive, e.g., 'Novelty Claims').")
     # Removed default=["abstract"] to prevent unintended filtering
     parser.add_argument('--section', type=str, nargs='*' , help="Sections to include (case-insensitive, e.g., 'Abstract', 'Introduction').")
+    parser.add_argument('--stream', action='store_true', help="Stream detailed outcomes to JSONL files as corpora are evaluated instead of collecting them into indented JSON files.")
+    # Sweep mode: the whole coverage/precision surface over a threshold and filter grid in one pass
+    parser.add_argument('--sweep', action='store_true', help="Evaluate every combination of --dm_grid, --c_score_grid, --theme_sets and --section_sets and write one CSV table.")
+    parser.add_argument('--dm_grid', type=float, nargs='+', default=list(range(11)), help="dm_score thresholds for --sweep.")
+    parser.add_argument('--c_score_grid', type=float, nargs='+', default=list(range(11)), help="c_score thresholds for --sweep.")
+    parser.add_argument('--theme_sets', type=str, nargs='+', default=['all'], help="Theme filters for --sweep: comma-separated themes per set, 'all' for no filter.")
+    parser.add_argument('--section_sets', type=str, nargs='+', default=['all'], help="Section filters for --sweep: comma-separated sections per set, 'all' for no filter.")
     return parser.parse_args()
 
 
+def parse_filter_set(value):
+    """'all' -> None (no filter), otherwise the lowercased comma-separated entries."""
+    if value.strip().lower() == 'all':
+        return None
+    return [entry.strip().lower() for entry in value.split(',') if entry.strip()]
+
+
+def get_corpus_scores(corpusId, data):
+    """
+    Returns the CorpusScores of a corpus, reusing the one built for the same `data`
+    object (not a copy or an updated dict) by an earlier call.
+    """
+    cached = _corpus_scores_cache.get(corpusId)
+    if cached is not None and cached[0] is data:
+        _corpus_scores_cache.move_to_end(corpusId)
+        return cached[1]
+    corpus_scores = CorpusScores(corpusId, data)
+    _corpus_scores_cache[corpusId] = (data, corpus_scores)
+    if len(_corpus_scores_cache) > CORPUS_SCORES_CACHE_SIZE:
+        _corpus_scores_cache.popitem(last=False)
+    return corpus_scores
+
+
 def calculate_metrics_from_cache(
     corpusId,
     data,
@@ -30,6 +77,8 @@ def calculate_metrics_from_cache(
     """
     Calculate coverage or precision metrics from cached data with filtering.
     Case-insensitive matching for themes and sections.
+    The corpus arrays are built once per corpus (see get_corpus_scores), so computing
+    both metrics, or several thresholds, reuses them.
     """
     # Convert filter criteria to lowercase
     if filter_themes is not None:
@@ -37,151 +86,92 @@ def calculate_metrics_from_cache(
     if filter_sections is not None:
         filter_sections = [section.lower() for section in filter_sections]
 
-    # Get lists of citances and claims
-    list_citances = data['citances']
-    list_claims = data['claims']
-    list_claim_texts = []
+    return get_corpus_scores(corpusId, data).compute(
+        metric, dm_threshold, c_score_threshold, filter_themes, filter_sections
+    )
 
-    # Filter claims based on theme and section
-    filtered_claims = []
-    for idx, claim_data in enumerate(list_claims):
-        include_claim = True
-
-        # Convert data strings to lowercase for comparison
-        claim_theme = claim_data.get('theme', '').lower()
-        claim_section = claim_data.get('section_name', '').lower()
-
-        if filter_themes is not None and claim_theme not in filter_themes:
-            include_claim = False
-
-        if filter_sections is not None and claim_section not in filter_sections:
-            include_claim = False
-
-        if include_claim:
-            filtered_claims.append(claim_data)
-            list_claim_texts.append(claim_data['claim'])
-
-    # Update list_claims after filtering
-    list_claims = filtered_claims
-
-    if not list_claims:
-        print(f"No claims left after filtering for corpus ID {corpusId}. Skipping.")
-        return None, 0.0
-
-    # Create a mapping from claim text to index
-    claim_text_to_index = {claim['claim']: idx for idx, claim in enumerate(list_claims)}
-
-    # Retrieve the appropriate matches from the cache
-    if metric == 'coverage':
-        # Use 'citance_to_claims' matches
-        matches_data = data['matches']['citance_to_claims']
-    elif metric == 'precision':
-        # Use 'claim_to_citances' matches
-        matches_data = data['matches']['claim_to_citances']
-    else:
-        raise ValueError(f"Unsupported metric: {metric}")
 
-    matches = []
-    matched_indices_citances = set()
-    matched_indices_claims = set()
-
-    # To keep track of unique matches based on metric
-    unique_matches_set = set()
-
-    # **New Step: Collect citances with potential matches above threshold**
-    potential_citances = set()
-    for match in matches_data:
-        citance_text = match.get('citance')
-        claim_data_match = match.get('claim')  # This is a dictionary
-        claim_text_match = claim_data_match.get('claim')
-
-        dm_score = match.get('dm_score', 0.0)
-        c_score = match.get('c_score', 0.0)
-
-        # Check if claim is in our filtered list
-        if claim_text_match not in claim_text_to_index:
-            continue  # Skip this match as the claim does not meet the filter criteria
-
-        # **Consider potential matches based on c_score_threshold only**
-        if c_score >= c_score_threshold:
-            potential_citances.add(citance_text)
-
-    # **Filter list_citances to only include those with potential matches**
-    filtered_citances = [cit for cit in list_citances if cit.get('citance') in potential_citances]
-
-    if not filtered_citances:
-        print(f"No citances left after filtering for corpus ID {corpusId}. Skipping.")
-        return None, 0.0
-
-    # Continue with the matching process, but only with filtered citances
-    for match in matches_data:
-        citance_text = match.get('citance')
-        claim_data_match = match.get('claim')  # This is a dictionary
-        claim_text_match = claim_data_match.get('claim')
+def sweep_metrics(corpora, dm_grid, c_score_grid, theme_sets, section_sets):
+    """
+    Coverage/precision averages for every (theme set, section set, c_score, dm) point
+    over an iterable of (corpusId, data),
+    aggregated the same way main() aggregates a single point. Each corpus is turned
+    into arrays once and every grid point reuses them.
+    """
+    filter_grid = [(themes, sections) for themes in theme_sets for sections in section_sets]
+    shape = (len(filter_grid), len(c_score_grid), len(dm_grid))
+    totals = {metric: np.zeros(shape) for metric in ('coverage', 'precision')}
+    counts = {metric: np.zeros(shape, dtype=np.int64) for metric in ('coverage', 'precision')}
+    denominators = {metric: np.zeros(shape, dtype=np.int64) for metric in ('coverage', 'precision')}
+
+    for corpusId, data in tqdm(corpora, desc="Sweeping cached corpora"):
+        if not data.get('citances', []) or not data.get('claims', []):
+            continue
+        try:
+            corpus_scores = CorpusScores(corpusId, data)
+        except Exception as e:
+            print(f"Error reading corpus ID {corpusId}: {e}\n")
+            continue
+        for f, (filter_themes, filter_sections) in enumerate(filter_grid):
+            claim_mask = corpus_scores.claim_mask(filter_themes, filter_sections)
+            for metric in ('coverage', 'precision'):
+                values, per_threshold = corpus_scores.surface(metric, dm_grid, c_score_grid, claim_mask)
+                ok = ~np.isnan(values)
+                totals[metric][f] += np.where(ok, values, 0.0)
+                counts[metric][f] += ok
+                denominators[metric][f] += ok * per_threshold[:, None]
+
+    rows = []
+    for f, (filter_themes, filter_sections) in enumerate(filter_grid):
+        for i, c_score_threshold in enumerate(c_score_grid):
+            for j, dm_threshold in enumerate(dm_grid):
+                count_coverage = int(counts['coverage'][f, i, j])
+                count_precision = int(counts['precision'][f, i, j])
+                rows.append({
+                    'themes': 'all' if filter_themes is None else ','.join(filter_themes),
+                    'sections': 'all' if filter_sections is None else ','.join(filter_sections),
+                    'dm_threshold': dm_threshold,
+                    'c_score_threshold': c_score_threshold,
+                    'average_coverage': totals['coverage'][f, i, j] / count_coverage if count_coverage > 0 else 0,
+                    'average_precision': totals['precision'][f, i, j] / count_precision if count_precision > 0 else 0,
+                    'coverage_corpora': count_coverage,
+                    'precision_corpora': count_precision,
+                    # Both averages are per corpus with a precision result, as in main()
+                    'average_claims_per_corpusId': denominators['precision'][f, i, j] / count_precision if count_precision > 0 else 0,
+                    'average_citances_per_corpusId': denominators['coverage'][f, i, j] / count_precision if count_precision > 0 else 0
+                })
+    return rows
+
+
+def run_sweep(args, corpora):
+    theme_sets = [parse_filter_set(value) for value in args.theme_sets]
+    section_sets = [parse_filter_set(value) for value in args.section_sets]
+    rows = sweep_metrics(corpora, args.dm_grid, args.c_score_grid, theme_sets, section_sets)
 
-        dm_score = match.get('dm_score', 0.0)
-        c_score = match.get('c_score', 0.0)
+    base_filename = os.path.splitext(os.path.basename(args.cache_file))[0]
+    sweep_filename = os.path.join(args.output_dir, f'{base_filename}_sweep.csv')
+    try:
+        with open(sweep_filename, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()) if rows else [])
+            writer.writeheader()
+            for row in rows:
+                writer.writerow({key: round(value, 4) if isinstance(value, float) else value for key, value in row.items()})
+        print(f"\nSweep table ({len(rows)} points) saved to {sweep_filename}")
+    except Exception as e:
+        print(f"Error saving sweep table: {e}")
 
-        # Check if claim is in our filtered list
-        if claim_text_match not in claim_text_to_index:
-            continue  # Skip this match as the claim does not meet the filter criteria
+    print(f"{'themes':<20} {'sections':<20} {'dm':>5} {'c':>5} {'coverage':>9} {'precision':>9}")
+    for row in rows:
+        print(f"{row['themes'][:20]:<20} {row['sections'][:20]:<20} {row['dm_threshold']:>5g} {row['c_score_threshold']:>5g} "
+              f"{row['average_coverage']:>9.4f} {row['average_precision']:>9.4f}")
 
-        # **Only consider matches where the citance is in filtered_citances**
-        if citance_text not in potential_citances:
-            continue
 
-        # Apply c_score and dm_score thresholds
-        if c_score >= c_score_threshold and dm_score >= dm_threshold:
-            # Create a unique identifier for the match
-            if metric == 'precision':
-                # For precision, ensure each claim is added only once
-                match_identifier = claim_text_match  # Unique per claim
-            elif metric == 'coverage':
-                # For coverage, ensure each citance is added only once
-                match_identifier = citance_text  # Unique per citance
-            else:
-                match_identifier = (citance_text, claim_text_match)  # Include both for safety
-
-            if match_identifier not in unique_matches_set:
-                unique_matches_set.add(match_identifier)
-                matches.append(match)
-
-                # Find indices in citances and claims lists
-                # For citances, match 'citance_text' to the 'citance' field in the citance data
-                citance_indices = [idx for idx, cit in enumerate(filtered_citances) if cit.get('citance') == citance_text]
-                if citance_indices:
-                    idx_citance = citance_indices[0]
-                    matched_indices_citances.add(idx_citance)
-
-                idx_claim = claim_text_to_index[claim_text_match]
-                matched_indices_claims.add(idx_claim)
-
-    number_of_matches = len(matches)
-
-    # **Update the number of citances after filtering**
-    num_citances_after_filtering = len(filtered_citances)
-
-    # Calculate metric based on the metric type
-    if metric == 'coverage':
-        # Coverage: Proportion of citances that have at least one matching claim
-        metric_value = len(matched_indices_citances) / num_citances_after_filtering if num_citances_after_filtering > 0 else 0
-    elif metric == 'precision':
-        # Precision: Proportion of claims that have at least one matching citance
-        metric_value = len(matched_indices_claims) / len(list_claims) if len(list_claims) > 0 else 0
-
-    print(f"Corpus ID {corpusId}")
-    print(f"Number of matches: {number_of_matches}")
-    print(f"Number of citances after filtering: {num_citances_after_filtering}")
-    print(f"{metric.capitalize()}: {metric_value}\n")
-
-    return {
-        'number_of_matches': number_of_matches,
-        'number_of_citances': num_citances_after_filtering,
-        'number_of_claims': len(list_claims),
-        'matched_pairs': matches,
-        'coverage': len(matched_indices_citances) / num_citances_after_filtering if metric == 'coverage' else 0,
-        'precision': len(matched_indices_claims) / len(list_claims) if metric == 'precision' else 0,
-    }, metric_value
+def open_outcome_sink(file_path):
+    """JSONL sink for detailed outcomes; a file left by an earlier run is replaced, not appended to."""
+    if os.path.exists(file_path):
+        os.remove(file_path)
+    # Outcomes can be regenerated from the cache, so fsync only on close
+    return JsonlSink(file_path, fsync_every=float('inf'), fsync_interval=float('inf'))
 
 
 def main():
@@ -202,13 +192,36 @@ def main():
     print(f"Filtering by themes: {filter_themes}")
     print(f"Filtering by sections: {filter_sections}")
 
-    # Load cache data
+    # Corpora are read from the cache one at a time, never all at once; unreadable
+    # records are skipped and a corpus stored twice counts once (its last record)
     try:
-        with open(args.cache_file, 'r') as f:
-            cache_data = json.load(f)
+        open(args.cache_file, 'r').close()
     except Exception as e:
         print(f"Error loading cache JSON file: {e}")
         return
+    corpora = iter_eval_cache(args.cache_file)
+
+    if args.sweep:
+        run_sweep(args, corpora)
+        return
+
+    base_filename = os.path.splitext(os.path.basename(args.cache_file))[0]
+    # Include filtering info in filenames
+    filter_info = ''
+    if filter_themes:
+        filter_info += "_themes_" + "_".join(filter_themes)
+    if filter_sections:
+        filter_info += "_sections_" + "_".join(filter_sections)
+    detailed_ext = '.jsonl' if args.stream else '.json'
+    coverage_detailed_filename = os.path.join(args.output_dir, f'{base_filename}_detailed_coverage_dm_{dm_threshold}_cscore_{c_score_threshold}{filter_info}{detailed_ext}')
+    precision_detailed_filename = os.path.join(args.output_dir, f'{base_filename}_detailed_precision_dm_{dm_threshold}_cscore_{c_score_threshold}{filter_info}{detailed_ext}')
+    scores_filename = os.path.join(args.output_dir, f'{base_filename}_scores_dm_{dm_threshold}_cscore_{c_score_threshold}{filter_info}.json')
+
+    # In stream mode detailed outcomes go straight to disk, one corpus per line
+    coverage_sink = precision_sink = None
+    if args.stream:
+        coverage_sink = open_outcome_sink(coverage_detailed_filename)
+        precision_sink = open_outcome_sink(precision_detailed_filename)
 
     coverage_outcomes = {}
     precision_outcomes = {}
@@ -222,31 +235,39 @@ def main():
     total_citances = 0
     count_corpusIds = 0
 
-    for corpusId, data in tqdm(cache_data.items(), desc="Processing cached corpora"):
+    for corpusId, data in tqdm(corpora, desc="Processing cached corpora"):
         list_citances = data.get('citances', [])
         list_claims = data.get('claims', [])
 
         if not list_citances or not list_claims:
-            print(f"Skipping corpus ID {corpusId} due to empty claims or citances.\n")
+            logger.debug(f"Skipping corpus ID {corpusId} due to empty claims or citances.")
             continue
 
         # We cannot update total_claims and total_citances here because filtering hasn't been applied yet
 
+        # Turn the corpus into score arrays once; both metrics reuse them
+        try:
+            corpus_scores = CorpusScores(corpusId, data)
+        except Exception as e:
+            print(f"Error reading corpus ID {corpusId}: {e}\n")
+            continue
+
         # Calculate coverage
         coverage_result = None
         try:
-            coverage_result = calculate_metrics_from_cache(
-                corpusId,
-                data,
-                dm_threshold=dm_threshold,
-                c_score_threshold=c_score_threshold,
-                metric='coverage',
+            coverage_result = corpus_scores.compute(
+                'coverage',
+                dm_threshold,
+                c_score_threshold,
                 filter_themes=filter_themes,
                 filter_sections=filter_sections
             )
             if coverage_result[0] is not None:
                 coverage_data, coverage_value = coverage_result
-                coverage_outcomes[corpusId] = coverage_data
+                if coverage_sink is not None:
+                    coverage_sink.write({EVAL_CACHE_KEY: corpusId, **coverage_data})
+                else:
+                    coverage_outcomes[corpusId] = coverage_data
                 coverage_sum += coverage_value
                 count_coverage += 1
 
@@ -258,18 +279,19 @@ def main():
         # Calculate precision
         precision_result = None
         try:
-            precision_result = calculate_metrics_from_cache(
-                corpusId,
-                data,
-                dm_threshold=dm_threshold,
-                c_score_threshold=c_score_threshold,
-                metric='precision',
+            precision_result = corpus_scores.compute(
+                'precision',
+                dm_threshold,
+                c_score_threshold,
                 filter_themes=filter_themes,
                 filter_sections=filter_sections
             )
             if precision_result[0] is not None:
                 precision_data, precision_value = precision_result
-                precision_outcomes[corpusId] = precision_data
+                if precision_sink is not None:
+                    precision_sink.write({EVAL_CACHE_KEY: corpusId, **precision_data})
+                else:
+                    precision_outcomes[corpusId] = precision_data
                 precision_sum += precision_value
                 count_precision += 1
 
@@ -283,35 +305,30 @@ def main():
     average_claims_per_corpusId = total_claims / count_corpusIds if count_corpusIds > 0 else 0
     average_citances_per_corpusId = total_citances / count_corpusIds if count_corpusIds > 0 else 0
 
-    # Save coverage outcomes
-    base_filename = os.path.splitext(os.path.basename(args.cache_file))[0]
-    # Include filtering info in filenames
-    filter_info = ''
-    if filter_themes:
-        filter_info += "_themes_" + "_".join(filter_themes)
-    if filter_sections:
-        filter_info += "_sections_" + "_".join(filter_sections)
-    coverage_detailed_filename = os.path.join(args.output_dir, f'{base_filename}_detailed_coverage_dm_{dm_threshold}_cscore_{c_score_threshold}{filter_info}.json')
     average_coverage = coverage_sum / count_coverage if count_coverage > 0 else 0
-
-    try:
-        with open(coverage_detailed_filename, 'w') as f:
-            json.dump(coverage_outcomes, f, indent=4)
-            print(f"\nCoverage outcomes saved to {coverage_detailed_filename}")
-    except Exception as e:
-        print(f"Error saving coverage outcomes: {e}")
-
-    # Save precision outcomes
-    precision_detailed_filename = os.path.join(args.output_dir, f'{base_filename}_detailed_precision_dm_{dm_threshold}_cscore_{c_score_threshold}{filter_info}.json')
-    scores_filename = os.path.join(args.output_dir, f'{base_filename}_scores_dm_{dm_threshold}_cscore_{c_score_threshold}{filter_info}.json')
     average_precision = precision_sum / count_precision if count_precision > 0 else 0
 
-    try:
-        with open(precision_detailed_filename, 'w') as f:
-            json.dump(precision_outcomes, f, indent=4)
-            print(f"Precision outcomes saved to {precision_detailed_filename}")
-    except Exception as e:
-        print(f"Error saving precision outcomes: {e}")
+    if args.stream:
+        coverage_sink.close()
+        precision_sink.close()
+        print(f"\nCoverage outcomes streamed to {coverage_detailed_filename}")
+        print(f"Precision outcomes streamed to {precision_detailed_filename}")
+    else:
+        # Save coverage outcomes
+        try:
+            with open(coverage_detailed_filename, 'w') as f:
+                json.dump(coverage_outcomes, f, indent=4)
+                print(f"\nCoverage outcomes saved to {coverage_detailed_filename}")
+        except Exception as e:
+            print(f"Error saving coverage outcomes: {e}")
+
+        # Save precision outcomes
+        try:
+            with open(precision_detailed_filename, 'w') as f:
+                json.dump(precision_outcomes, f, indent=4)
+                print(f"Precision outcomes saved to {precision_detailed_filename}")
+        except Exception as e:
+            print(f"Error saving precision outcomes: {e}")
 
     # Save average scores including the new average claims and citances per corpus ID
     try:
@@ -0,0 +1,211 @@
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float, np.number))
+
+
+class CorpusScores:
+    """
+    One corpus of the eval cache turned into NumPy arrays, built once and reused for
+    every metric, threshold and filter.
+
+    Claims and citances are reduced to integer text ids; each match view
+    (citance_to_claims / claim_to_citances) becomes parallel arrays of claim text id,
+    citance text id, c_score and dm_score. Coverage and precision are then boolean
+    masks and unique-reductions over those arrays, with the same results as the
+    original per-match loop.
+    """
+
+    def __init__(self, corpusId, data):
+        self.corpusId = corpusId
+        list_claims = data['claims']
+        list_citances = data['citances']
+
+        # Claim text ids, and the lowercased theme/section code of every claim
+        self.claim_text_ids = {}
+        claim_text_of = []
+        self.theme_codes = {}
+        self.section_codes = {}
+        claim_theme = []
+        claim_section = []
+        for claim_data in list_claims:
+            claim_text_of.append(self.claim_text_ids.setdefault(claim_data['claim'], len(self.claim_text_ids)))
+            # section_name is None for headings the resolver could not map
+            theme = (claim_data.get('theme') or '').lower()
+            section = (claim_data.get('section_name') or '').lower()
+            claim_theme.append(self.theme_codes.setdefault(theme, len(self.theme_codes)))
+            claim_section.append(self.section_codes.setdefault(section, len(self.section_codes)))
+        self.claim_text_of = np.array(claim_text_of, dtype=np.int64)
+        self.claim_theme = np.array(claim_theme, dtype=np.int64)
+        self.claim_section = np.array(claim_section, dtype=np.int64)
+
+        # Citance text ids: texts of the citance list come first, so id < n_list_citance_texts
+        # means the text is one of the corpus' citances
+        self.citance_text_ids = {}
+        self.list_citance_ids = np.array(
+            [self.citance_text_ids.setdefault(cit.get('citance'), len(self.citance_text_ids)) for cit in list_citances],
+            dtype=np.int64
+        )
+        self.n_list_citance_texts = len(self.citance_text_ids)
+
+        self.views = {
+            'coverage': self._build_view(data['matches']['citance_to_claims']),
+            'precision': self._build_view(data['matches']['claim_to_citances']),
+        }
+
+    def _build_view(self, matches_data) -> dict:
+        # Filled as Python lists and converted once; item assignment into arrays is slower
+        claim_text_ids = self.claim_text_ids
+        citance_text_ids = self.citance_text_ids
+        claim_ids = []
+        citance_ids = []
+        c_scores = []
+        dm_scores = []
+        for match in matches_data:
+            # -1 (an unknown claim text) never passes the claim filter
+            claim_ids.append(claim_text_ids.get(match.get('claim').get('claim'), -1))
+            citance_ids.append(citance_text_ids.setdefault(match.get('citance'), len(citance_text_ids)))
+            c_score = match.get('c_score', 0.0)
+            dm_score = match.get('dm_score', 0.0)
+            c_scores.append(c_score if _is_number(c_score) else None)
+            dm_scores.append(dm_score if _is_number(dm_score) else None)
+        c_missing = np.array([score is None for score in c_scores], dtype=bool)
+        dm_missing = np.array([score is None for score in dm_scores], dtype=bool)
+        return {
+            'matches': matches_data,
+            'claim_ids': np.array(claim_ids, dtype=np.int64),
+            'citance_ids': np.array(citance_ids, dtype=np.int64),
+            # None becomes NaN
+            'c_scores': np.array(c_scores, dtype=float),
+            'dm_scores': np.array(dm_scores, dtype=float),
+            'c_missing': c_missing,
+            'dm_missing': dm_missing,
+        }
+
+    def claim_mask(self, filter_themes=None, filter_sections=None):
+        """Boolean mask over the claim list; filters must already be lowercased."""
+        mask = np.ones(len(self.claim_text_of), dtype=bool)
+        if filter_themes is not None:
+            codes = [self.theme_codes[theme] for theme in filter_themes if theme in self.theme_codes]
+            mask &= np.isin(self.claim_theme, codes)
+        if filter_sections is not None:
+            codes = [self.section_codes[section] for section in filter_sections if section in self.section_codes]
+            mask &= np.isin(self.claim_section, codes)
+        return mask
+
+    def potential(self, metric, c_score_threshold, claim_mask):
+        """
+        Mask of matches on a filtered claim with c_score >= threshold, and the number of
+        list citances whose text has such a match (the citances kept after filtering).
+        """
+        view = self.views[metric]
+        text_ok = np.zeros(len(self.claim_text_ids) + 1, dtype=bool)  # Last slot stands for id -1
+        text_ok[self.claim_text_of[claim_mask]] = True
+        relevant = text_ok[view['claim_ids']]
+        if (relevant & view['c_missing']).any():
+            raise TypeError(f"Non-numeric c_score in corpus ID {self.corpusId}")
+        potential = relevant & (view['c_scores'] >= c_score_threshold)
+        potential_citances = np.unique(view['citance_ids'][potential])
+        num_citances = int(np.isin(self.list_citance_ids, potential_citances).sum())
+        return potential, num_citances
+
+    def surface(self, metric, dm_thresholds, c_score_thresholds, claim_mask):
+        """
+        Metric value for every (c_score threshold, dm threshold) pair of the grid, in one
+        pass per c_score threshold: the best dm_score of each citance (coverage) or claim
+        (precision) is sorted once and the thresholds are located with searchsorted.
+
+        Returns (values, denominators): values has shape (len(c_score_thresholds),
+        len(dm_thresholds)) and is NaN where compute() would skip the corpus or raise;
+        denominators holds number_of_citances (coverage) or number_of_claims (precision)
+        per c_score threshold.
+        """
+        view = self.views[metric]
+        dm_thresholds = np.asarray(dm_thresholds, dtype=float)
+        values = np.full((len(c_score_thresholds), len(dm_thresholds)), np.nan)
+        denominators = np.zeros(len(c_score_thresholds), dtype=np.int64)
+        num_claims = int(claim_mask.sum())
+        if not num_claims:
+            return values, denominators
+
+        for row, c_score_threshold in enumerate(c_score_thresholds):
+            try:
+                potential, num_citances = self.potential(metric, c_score_threshold, claim_mask)
+            except TypeError:
+                continue
+            if not num_citances or (potential & view['dm_missing']).any():
+                continue
+
+            if metric == 'coverage':
+                keys = view['citance_ids'][potential]
+                dm_scores = view['dm_scores'][potential]
+                in_list = keys < self.n_list_citance_texts
+                keys, dm_scores = keys[in_list], dm_scores[in_list]
+                denominator = num_citances
+            else:
+                keys = view['claim_ids'][potential]
+                dm_scores = view['dm_scores'][potential]
+                denominator = num_claims
+
+            # Best dm_score per key; a key counts at threshold t when its best score >= t
+            best = np.full(int(keys.max()) + 1 if len(keys) else 0, -np.inf)
+            np.fmax.at(best, keys, dm_scores)
+            best = np.sort(best[best > -np.inf])
+            matched = len(best) - np.searchsorted(best, dm_thresholds, side='left')
+            values[row] = matched / denominator
+            denominators[row] = denominator
+        return values, denominators
+
+    def compute(self, metric, dm_threshold, c_score_threshold, filter_themes=None, filter_sections=None):
+        """
+        Same contract as inference_with_gpt.calculate_metrics_from_cache: returns
+        (result dict, metric value), or (None, 0.0) when filtering leaves nothing.
+        """
+        if metric not in self.views:
+            raise ValueError(f"Unsupported metric: {metric}")
+        view = self.views[metric]
+
+        claim_mask = self.claim_mask(filter_themes, filter_sections)
+        num_claims = int(claim_mask.sum())
+        if not num_claims:
+            logger.debug(f"No claims left after filtering for corpus ID {self.corpusId}. Skipping.")
+            return None, 0.0
+
+        potential, num_citances = self.potential(metric, c_score_threshold, claim_mask)
+        if not num_citances:
+            logger.debug(f"No citances left after filtering for corpus ID {self.corpusId}. Skipping.")
+            return None, 0.0
+
+        if (potential & view['dm_missing']).any():
+            raise TypeError(f"Non-numeric dm_score in corpus ID {self.corpusId}")
+        accepted = np.flatnonzero(potential & (view['dm_scores'] >= dm_threshold))
+
+        # Coverage keeps one match per citance text, precision one per claim text
+        keys = view['citance_ids'][accepted] if metric == 'coverage' else view['claim_ids'][accepted]
+        unique_keys, first = np.unique(keys, return_index=True)
+        matches = [view['matches'][k] for k in np.sort(accepted[first])]
+
+        if metric == 'coverage':
+            matched_citances = int((unique_keys < self.n_list_citance_texts).sum())
+            metric_value = matched_citances / num_citances
+            coverage, precision = metric_value, 0
+        else:
+            metric_value = len(unique_keys) / num_claims
+            coverage, precision = 0, metric_value
+
+        logger.debug(f"Corpus ID {self.corpusId}: {len(matches)} matches, {num_citances} citances after filtering, "
+                     f"{metric} {metric_value}")
+
+        return {
+            'number_of_matches': len(matches),
+            'number_of_citances': num_citances,
+            'number_of_claims': num_claims,
+            'matched_pairs': matches,
+            'coverage': coverage,
+            'precision': precision,
+        }, metric_value
@@ -0,0 +1,120 @@
+import json
+import logging
+import os
+
+from llm.rate_limit import AdaptiveLimiter, MAX_RATE_LIMIT_RETRIES, estimate_request_tokens, get_limiter
+from llm.response_cache import cache_key, get_response_cache, is_cacheable
+
+logger = logging.getLogger(__name__)
+
+# Point this at a local mock server (see llm/mock_server.py) to run without the OpenAI API
+DEFAULT_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+
+
+class CompletionBackend:
+    """
+    OpenAI-compatible chat completion endpoint.
+
+    Every request goes through the shared response cache and the adaptive rate
+    limiter of its base URL, so all drivers talking to the same account share them.
+    """
+
+    def __init__(self, base_url: str = DEFAULT_BASE_URL, api_key: str = None,
+                 limiter: AdaptiveLimiter = None, use_cache: bool = True):
+        self.base_url = base_url.rstrip('/')
+        self.api_key = api_key if api_key is not None else os.getenv("OPENAI_API_KEY")
+        self.limiter = limiter or get_limiter(self.base_url)
+        self.use_cache = use_cache
+
+    @property
+    def url(self) -> str:
+        return f"{self.base_url}/chat/completions"
+
+    @property
+    def headers(self) -> dict:
+        return {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.api_key}"
+        }
+
+    async def create(self, session, payload: dict, refresh_cache: bool = False, validate=None, on_send=None) -> dict:
+        """
+        POSTs a chat completion request, retrying on 429, and returns the JSON body.
+
+        Only temperature-0 requests go through the cache. `refresh_cache` skips the
+        cache lookup but still stores the fresh response; responses cut off by the
+        token limit, or rejected by `validate(response_json)`, are not stored.
+        `on_send()` is called once when the request goes to the API (not on a cache hit).
+        Raises on any other non-200 status.
+        """
+        cache = get_response_cache() if self.use_cache and is_cacheable(payload) else None
+        key = None
+        if cache is not None:
+            key = cache_key(payload)
+            if not refresh_cache:
+                cached = cache.get(key)
+                if cached is not None:
+                    return cached
+
+        if on_send is not None:
+            on_send()
+        tokens = estimate_request_tokens(payload.get("messages", []))
+        for attempt in range(MAX_RATE_LIMIT_RETRIES):
+            async with self.limiter.request(tokens):
+                async with session.post(self.url, headers=self.headers, json=payload) as resp:
+                    self.limiter.record_response(resp.status, resp.headers)
+                    if resp.status == 429:
+                        logger.warning(f"429 from API (attempt {attempt + 1}/{MAX_RATE_LIMIT_RETRIES})")
+                        continue
+                    if resp.status != 200:
+                        response_text = await resp.text()
+                        raise Exception(f"API call failed with status {resp.status}: {response_text}")
+                    response_json = await resp.json()
+            if cache is not None and self._storable(response_json, validate):
+                cache.put(key, response_json)
+            return response_json
+        raise Exception(f"API call still rate limited after {MAX_RATE_LIMIT_RETRIES} attempts")
+
+    @staticmethod
+    def _storable(response_json: dict, validate=None) -> bool:
+        try:
+            choice = response_json["choices"][0]
+        except (KeyError, IndexError, TypeError):
+            return False
+        if choice.get("finish_reason") == "length":
+            return False
+        return validate is None or validate(response_json)
+
+    async def complete(self, session, messages: list, model: str, temperature: float = 0.0,
+                       refresh_cache: bool = False, validate=None, on_send=None) -> str:
+        """
+        Sends chat messages and returns the content of the first choice. `validate(content)`
+        returning False keeps the response out of the cache (e.g. unparseable output).
+        """
+        api_messages = []
+        for message in messages:
+            content = message.get("content", "")
+            # The API only accepts string content; serialize anything else
+            if not isinstance(content, str):
+                content = json.dumps(content, ensure_ascii=False)
+            api_messages.append({"role": message.get("role"), "content": content})
+
+        response_json = await self.create(session, {
+            "model": model,
+            "messages": api_messages,
+            "temperature": temperature
+        }, refresh_cache=refresh_cache, on_send=on_send,
+            validate=(lambda response: validate(response["choices"][0]["message"]["content"])) if validate else None)
+        return response_json["choices"][0]['message']["content"]
+
+
+_backends = {}
+
+
+def get_backend(base_url: str = None, api_key: str = None) -> CompletionBackend:
+    """Returns the process-wide backend for a base URL and API key, creating it on first use."""
+    base_url = base_url or DEFAULT_BASE_URL
+    key = (base_url, api_key)
+    if key not in _backends:
+        _backends[key] = CompletionBackend(base_url, api_key)
+    return _backends[key]
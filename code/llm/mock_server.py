@@ -0,0 +1,264 @@
+"""Local stand-in for the OpenAI chat completions API, for offline load testing.
+
+Serves POST /v1/chat/completions with canned or synthetic JSON answers, configurable
+latency, server errors and 429s, and x-ratelimit-* headers. Point the drivers at it with
+OPENAI_BASE_URL=http://127.0.0.1:8001/v1 (or --base_url for eval_with_gpt.py).
+"""
+import argparse
+import ast
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import re
+import time
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+THEMES = ['Novelty', 'Performance', 'Applicability', 'Background']
+SECTIONS = ['Abstract', 'Introduction', 'Methods', 'Results', 'Discussion', 'Conclusion']
+
+COMPARISON_BLOCK = re.compile(
+    r'^(Citance|Claim) \d+:\n(?:Citance|Claim): (.*?)\n(Claims|Citances): (\[.*?\])\n?$',
+    re.MULTILINE | re.DOTALL
+)
+
+# Numbered prompts (compact comparison and pair scores): "[n] text" candidates, then query lines
+NUMBERED_ITEM = re.compile(r'^\[(\d+)\] (.*)$', re.MULTILINE)
+NUMBERED_QUERY = re.compile(r'^(Citance|Claim) (\d+): (.*?)(?:\nScore against (?:claims|citances): ([\d, ]+))?$', re.MULTILINE)
+
+
+def synthetic_dm(citance: str, claim: str) -> int:
+    """Deterministic degree of match for a (citance, claim) pair, so reruns and both directions agree."""
+    digest = hashlib.md5(f"{citance}\x00{claim}".encode('utf-8')).digest()
+    return digest[0] % 11
+
+
+def _synthetic_claims(rng: random.Random, count: int) -> str:
+    claims = [
+        {
+            "claim": f"Synthetic claim {i + 1} about method {rng.randint(1, 10 ** 6)}.",
+            "section_name": rng.choice(SECTIONS),
+            "context": "",
+            "theme": rng.choice(THEMES)
+        }
+        for i in range(count)
+    ]
+    return json.dumps(claims)
+
+
+def _synthetic_comparison(prompt: str) -> str:
+    key = "citance_to_claims" if '"citance_to_claims"' in prompt else "claim_to_citances"
+    entries = []
+    for kind, text, _, candidates in COMPARISON_BLOCK.findall(prompt):
+        try:
+            candidates = ast.literal_eval(candidates)
+        except (ValueError, SyntaxError):
+            candidates = []
+        if kind == "Citance":
+            matches = [{"claim": claim, "dm": synthetic_dm(text, claim)} for claim in candidates]
+            entries.append({"citance": text, "matches": matches})
+        else:
+            matches = [{"citance": citance, "dm": synthetic_dm(citance, text)} for citance in candidates]
+            entries.append({"claim": text, "matches": matches})
+    return json.dumps({key: entries})
+
+
+def _numbered_queries(prompt: str):
+    """Yields (kind, query number, query text, {candidate number: text}) for a numbered prompt."""
+    items = {int(number): text for number, text in NUMBERED_ITEM.findall(prompt)}
+    for kind, number, text, candidates in NUMBERED_QUERY.findall(prompt):
+        numbers = [int(n) for n in candidates.split(',') if n.strip()] if candidates else sorted(items)
+        yield kind, int(number), text, {n: items.get(n, "") for n in numbers}
+
+
+def _synthetic_compact_comparison(prompt: str) -> str:
+    key = "citance_to_claims" if '"citance_to_claims"' in prompt else "claim_to_citances"
+    entries = []
+    for kind, number, text, candidates in _numbered_queries(prompt):
+        if kind == "Citance":
+            matches = [[n, synthetic_dm(text, claim)] for n, claim in candidates.items()]
+            entries.append({"citance": number, "matches": matches})
+        else:
+            matches = [[n, synthetic_dm(citance, text)] for n, citance in candidates.items()]
+            entries.append({"claim": number, "matches": matches})
+    return json.dumps({key: entries})
+
+
+def _synthetic_pair_scores(prompt: str) -> str:
+    scores = []
+    for _, number, citance, candidates in _numbered_queries(prompt):
+        for claim_number, claim in candidates.items():
+            scores.append({"citance": number, "claim": claim_number, "dm": synthetic_dm(citance, claim)})
+    return json.dumps({"scores": scores})
+
+
+def synthetic_answer(messages: list, rng: random.Random, claims_per_paper: int = 8) -> str:
+    """Builds a plausible answer for the prompt types used in this repo."""
+    text = "\n".join(str(message.get("content", "")) for message in messages)
+    if "extract the novel main findings" in text:
+        return _synthetic_claims(rng, claims_per_paper)
+    if '"scores"' in text:
+        return _synthetic_pair_scores(text)
+    if '"citance_to_claims"' in text or '"claim_to_citances"' in text:
+        if NUMBERED_ITEM.search(text):
+            return _synthetic_compact_comparison(text)
+        return _synthetic_comparison(text)
+    return "OK"
+
+
+class MockCompletionServer:
+    """
+    Args:
+        latency (float): Median response latency in seconds.
+        latency_sigma (float): Sigma of the lognormal latency distribution (0 for constant latency).
+        error_rate (float): Probability of answering with a 500.
+        rate_limit_rate (float): Probability of answering with a random 429.
+        requests_per_minute (int): Simulated account request limit; exceeding it returns 429.
+        tokens_per_minute (int): Simulated account token limit; exceeding it returns 429.
+        retry_after (float): Retry-After value sent with 429s.
+        canned (list, optional): Answers to return in rotation instead of synthetic ones.
+        seed (int, optional): Seed for the latency/error/answer random generator.
+    """
+
+    def __init__(self, latency: float = 0.2, latency_sigma: float = 0.5, error_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0, requests_per_minute: int = None, tokens_per_minute: int = None,
+                 retry_after: float = 1.0, canned: list = None, seed: int = None):
+        self.latency = latency
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.retry_after = retry_after
+        self.canned = canned
+        self.rng = random.Random(seed)
+        self.counts = {"requests": 0, "ok": 0, "errors": 0, "rate_limited": 0}
+        self._window_start = time.monotonic()
+        self._window_requests = 0
+        self._window_tokens = 0
+
+    def _rate_limit_headers(self) -> dict:
+        now = time.monotonic()
+        if now - self._window_start >= 60:
+            self._window_start = now
+            self._window_requests = 0
+            self._window_tokens = 0
+        reset = max(0.0, 60 - (now - self._window_start))
+        headers = {}
+        if self.requests_per_minute:
+            headers['x-ratelimit-limit-requests'] = str(self.requests_per_minute)
+            headers['x-ratelimit-remaining-requests'] = str(max(0, self.requests_per_minute - self._window_requests))
+            headers['x-ratelimit-reset-requests'] = f"{reset:.3f}s"
+        if self.tokens_per_minute:
+            headers['x-ratelimit-limit-tokens'] = str(self.tokens_per_minute)
+            headers['x-ratelimit-remaining-tokens'] = str(max(0, self.tokens_per_minute - self._window_tokens))
+            headers['x-ratelimit-reset-tokens'] = f"{reset:.3f}s"
+        return headers
+
+    def _over_limit(self, tokens: int) -> bool:
+        if self.requests_per_minute and self._window_requests >= self.requests_per_minute:
+            return True
+        if self.tokens_per_minute and self._window_tokens + tokens > self.tokens_per_minute:
+            return True
+        return False
+
+    def _sample_latency(self) -> float:
+        if self.latency <= 0:
+            return 0.0
+        if self.latency_sigma <= 0:
+            return self.latency
+        return self.rng.lognormvariate(0.0, self.latency_sigma) * self.latency
+
+    async def handle_chat_completions(self, request: web.Request) -> web.Response:
+        self.counts["requests"] += 1
+        payload = await request.json()
+        messages = payload.get("messages", [])
+        prompt_tokens = sum(len(str(message.get("content", ""))) for message in messages) // 4
+
+        headers = self._rate_limit_headers()
+        if self._over_limit(prompt_tokens) or self.rng.random() < self.rate_limit_rate:
+            self.counts["rate_limited"] += 1
+            headers['retry-after'] = str(self.retry_after)
+            return web.json_response({"error": {"message": "Rate limit reached", "type": "requests"}},
+                                     status=429, headers=headers)
+        self._window_requests += 1
+        self._window_tokens += prompt_tokens
+
+        await asyncio.sleep(self._sample_latency())
+
+        if self.rng.random() < self.error_rate:
+            self.counts["errors"] += 1
+            return web.json_response({"error": {"message": "Synthetic server error"}}, status=500, headers=headers)
+
+        if self.canned:
+            content = self.canned[self.counts["ok"] % len(self.canned)]
+        else:
+            content = synthetic_answer(messages, self.rng)
+        self.counts["ok"] += 1
+        return web.json_response({
+            "id": f"mock-{self.counts['requests']}",
+            "object": "chat.completion",
+            "model": payload.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(content) // 4}
+        }, headers=headers)
+
+    def create_app(self) -> web.Application:
+        app = web.Application(client_max_size=64 * 1024 ** 2)
+        app.router.add_post('/v1/chat/completions', self.handle_chat_completions)
+        app.router.add_post('/chat/completions', self.handle_chat_completions)
+        return app
+
+
+async def start_mock_server(host: str = "127.0.0.1", port: int = 8001, **kwargs):
+    """Starts a mock server inside the running event loop; returns (server, runner). Call runner.cleanup() to stop."""
+    server = MockCompletionServer(**kwargs)
+    runner = web.AppRunner(server.create_app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return server, runner
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run a local mock of the OpenAI chat completions API.")
+    parser.add_argument('--host', type=str, default="127.0.0.1", help="Host to bind.")
+    parser.add_argument('--port', type=int, default=8001, help="Port to bind.")
+    parser.add_argument('--latency', type=float, default=0.2, help="Median response latency in seconds.")
+    parser.add_argument('--latency_sigma', type=float, default=0.5, help="Lognormal sigma of the latency (0 for constant).")
+    parser.add_argument('--error_rate', type=float, default=0.0, help="Probability of a 500 response.")
+    parser.add_argument('--rate_limit_rate', type=float, default=0.0, help="Probability of a random 429 response.")
+    parser.add_argument('--requests_per_minute', type=int, default=None, help="Simulated request limit per minute.")
+    parser.add_argument('--tokens_per_minute', type=int, default=None, help="Simulated token limit per minute.")
+    parser.add_argument('--retry_after', type=float, default=1.0, help="Retry-After seconds sent with 429s.")
+    parser.add_argument('--canned', type=str, default=None, help="JSON file with a list of answers to return in rotation.")
+    parser.add_argument('--seed', type=int, default=None, help="Random seed.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    canned = None
+    if args.canned:
+        with open(args.canned, 'r', encoding='utf-8') as f:
+            canned = json.load(f)
+    server = MockCompletionServer(
+        latency=args.latency,
+        latency_sigma=args.latency_sigma,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        requests_per_minute=args.requests_per_minute,
+        tokens_per_minute=args.tokens_per_minute,
+        retry_after=args.retry_after,
+        canned=canned,
+        seed=args.seed
+    )
+    print(f"Mock completion server on http://{args.host}:{args.port}/v1")
+    web.run_app(server.create_app(), host=args.host, port=args.port, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
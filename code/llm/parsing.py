@@ -0,0 +1,119 @@
+import json
+import logging
+import re
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+# How often each parsing tier produced the result, for spotting slow-path drift at scale
+parse_stats = Counter()
+
+CODE_FENCE = re.compile(r'^\s*```[a-zA-Z]*\s*\n?|\n?\s*```\s*$')
+# A string literal (possibly cut off at the end) or a comma before a closing bracket;
+# strings are matched so that commas inside them are left alone
+STRING_OR_TRAILING_COMMA = re.compile(r'"(?:[^"\\]|\\[\s\S])*(?:"|$)|,(\s*[\]}])')
+
+
+def strip_code_fences(text: str) -> str:
+    return CODE_FENCE.sub('', text.strip()).strip()
+
+
+def _drop_trailing_commas(text: str) -> str:
+    """Removes commas directly before ] or }, outside of string values."""
+    return STRING_OR_TRAILING_COMMA.sub(lambda match: match.group(0) if match.group(1) is None else match.group(1), text)
+
+
+def _close_truncated(text: str) -> str:
+    """
+    Cuts a truncated JSON document back to its last complete nested value and
+    closes the brackets still open at that point.
+    """
+    stack = []
+    in_string = False
+    escaped = False
+    last_safe = None  # (end index, open brackets) after the last completed nested value
+    for i, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char == '"':
+            in_string = True
+        elif char in '[{':
+            stack.append(char)
+        elif char in ']}':
+            if not stack:
+                return text
+            stack.pop()
+            if not stack:
+                return text[:i + 1]
+            last_safe = (i + 1, list(stack))
+    if not stack or last_safe is None:
+        return text
+    end, open_brackets = last_safe
+    closers = ''.join(']' if bracket == '[' else '}' for bracket in reversed(open_brackets))
+    return text[:end].rstrip().rstrip(',') + closers
+
+
+def repair_json(text: str) -> str:
+    """Cheap fixes for common model-output damage: code fences, surrounding prose, trailing commas, truncation."""
+    text = strip_code_fences(text)
+    starts = [i for i in (text.find('['), text.find('{')) if i != -1]
+    if starts:
+        text = text[min(starts):]
+    text = _drop_trailing_commas(text)
+    return _close_truncated(text)
+
+
+def is_parseable(text: str) -> bool:
+    """Whether the strict or repair tier of parse_json_tiered would parse `text`; not counted in parse_stats."""
+    stripped = strip_code_fences(text)
+    for candidate in (stripped, repair_json(stripped)):
+        try:
+            json.loads(candidate)
+            return True
+        except ValueError:
+            pass
+    return False
+
+
+def parse_json_tiered(text: str, fallbacks=()):
+    """
+    Parses model output with the cheapest tier that succeeds.
+
+    Tiers: strict json.loads, json.loads after repair_json, then each (name, func)
+    in `fallbacks` in order. A fallback fails by raising or returning None or an
+    empty result (e.g. a regex tier that found nothing).
+    Returns None when every tier fails. Hits are counted in parse_stats.
+    """
+    stripped = strip_code_fences(text)
+    try:
+        result = json.loads(stripped)
+        parse_stats['fast'] += 1
+        return result
+    except ValueError:
+        pass
+
+    try:
+        result = json.loads(repair_json(stripped))
+        parse_stats['repair'] += 1
+        return result
+    except ValueError:
+        pass
+
+    for name, func in fallbacks:
+        try:
+            result = func(stripped)
+        except Exception as e:
+            logger.debug(f"Parse tier {name} failed: {e}")
+            continue
+        if result is not None and result != [] and result != {}:
+            parse_stats[name] += 1
+            return result
+
+    parse_stats['failed'] += 1
+    return None
@@ -0,0 +1,228 @@
+import asyncio
+import json
+import logging
+import re
+import time
+from contextlib import asynccontextmanager
+
+from llm.tokens import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Retries of a single request that keeps getting 429s
+MAX_RATE_LIMIT_RETRIES = 8
+
+# Pause used when a 429 carries no Retry-After / reset header
+DEFAULT_RETRY_AFTER = 1.0
+
+# Rough output allowance added to the prompt estimate when reserving tokens
+DEFAULT_OUTPUT_TOKENS = 512
+
+_DURATION_PART = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+
+
+def parse_duration(value) -> float:
+    """Parses OpenAI reset durations such as '1s', '6m0s' or '20ms' into seconds."""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    seconds = 0.0
+    matched = False
+    for number, unit in _DURATION_PART.findall(value):
+        matched = True
+        number = float(number)
+        if unit == 'h':
+            seconds += number * 3600
+        elif unit == 'm':
+            seconds += number * 60
+        elif unit == 's':
+            seconds += number
+        else:
+            seconds += number / 1000
+    return seconds if matched else None
+
+
+def _header_number(headers, name):
+    value = headers.get(name)
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def estimate_request_tokens(messages, max_output_tokens: int = DEFAULT_OUTPUT_TOKENS) -> int:
+    """Token estimate for a chat request: prompt tokens plus an allowance for the output."""
+    tokens = 0
+    for message in messages:
+        content = message.get("content", "")
+        tokens += estimate_tokens(content if isinstance(content, str) else json.dumps(content))
+    return tokens + max_output_tokens
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency and tokens-per-minute controller shared by the OpenAI clients.
+
+    The in-flight limit starts in slow start, doubling every round of successful
+    responses until the first 429; after that it grows by about one request per round
+    and is halved on a 429. Requests also wait on a token bucket whose capacity and
+    level follow the x-ratelimit-*-tokens headers, and every request pauses while
+    a Retry-After or reset window from the server is running.
+    """
+
+    def __init__(self, initial_concurrency: int = 16, min_concurrency: int = 1, max_concurrency: int = 256,
+                 tokens_per_minute: float = None, decrease_factor: float = 0.5):
+        self.limit = float(initial_concurrency)
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.decrease_factor = decrease_factor
+        self.tokens_per_minute = tokens_per_minute
+        self.in_flight = 0
+        self.successes = 0
+        self.rate_limited = 0
+        self._tokens = tokens_per_minute
+        self._last_refill = time.monotonic()
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self.slow_start = True
+        self._condition = None
+        self._loop = None
+
+    @property
+    def condition(self):
+        # Created lazily so the limiter can be built outside of a running event loop, and
+        # again for each new loop: the limiter outlives asyncio.run() calls, but a
+        # Condition is bound to the loop it was first used in. Requests of a finished
+        # loop are no longer in flight; the learned limit and token bucket carry over.
+        loop = asyncio.get_running_loop()
+        if self._condition is None or self._loop is not loop:
+            self._condition = asyncio.Condition()
+            self._loop = loop
+            self.in_flight = 0
+        return self._condition
+
+    def _refill(self, now):
+        if self.tokens_per_minute is None:
+            return
+        elapsed = now - self._last_refill
+        self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60)
+        self._last_refill = now
+
+    def _token_wait(self, tokens, now) -> float:
+        """Seconds until `tokens` are available in the bucket (0 if they are now)."""
+        if self.tokens_per_minute is None:
+            return 0.0
+        self._refill(now)
+        tokens = min(tokens, self.tokens_per_minute)
+        if self._tokens >= tokens:
+            return 0.0
+        return (tokens - self._tokens) * 60 / self.tokens_per_minute
+
+    async def acquire(self, tokens: int = 0):
+        async with self.condition:
+            while True:
+                now = time.monotonic()
+                wait = self._paused_until - now
+                if wait <= 0 and self.in_flight < max(int(self.limit), self.min_concurrency):
+                    wait = self._token_wait(tokens, now)
+                    if wait <= 0:
+                        if self.tokens_per_minute is not None:
+                            self._tokens -= min(tokens, self.tokens_per_minute)
+                        self.in_flight += 1
+                        return
+                try:
+                    if wait > 0:
+                        await asyncio.wait_for(self.condition.wait(), timeout=wait)
+                    else:
+                        await self.condition.wait()
+                except asyncio.TimeoutError:
+                    pass
+
+    async def release(self):
+        async with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    @asynccontextmanager
+    async def request(self, tokens: int = 0):
+        """Holds one request slot (and `tokens` from the bucket) for the duration of the block."""
+        await self.acquire(tokens)
+        try:
+            yield self
+        finally:
+            await self.release()
+
+    def on_success(self):
+        self.successes += 1
+        # Only while the limit is what holds requests back; otherwise it would creep up unchecked
+        if self.slow_start:
+            # Slow start: +1 per success doubles the limit every round until the first 429.
+            # Slots freed by a raise are only taken after this response is released, so
+            # half-full already counts as held back
+            if self.in_flight >= self.limit / 2:
+                self.limit = min(self.max_concurrency, self.limit + 1.0)
+        elif self.in_flight >= int(self.limit):
+            # Additive increase: about +1 per `limit` successful responses
+            self.limit = min(self.max_concurrency, self.limit + 1.0 / max(self.limit, 1.0))
+
+    def on_rate_limited(self, retry_after: float = None):
+        self.rate_limited += 1
+        self.slow_start = False
+        now = time.monotonic()
+        pause = retry_after if retry_after is not None else DEFAULT_RETRY_AFTER
+        self._paused_until = max(self._paused_until, now + pause)
+        # Multiplicative decrease, at most once per pause window so a burst of
+        # 429s from requests already in flight does not collapse the limit
+        if now - self._last_decrease >= pause:
+            self.limit = max(self.min_concurrency, self.limit * self.decrease_factor)
+            self._last_decrease = now
+            logger.warning(f"Rate limited; concurrency limit lowered to {self.limit:.1f}, pausing {pause:.2f}s")
+
+    def update_from_headers(self, headers):
+        """Adjusts the token bucket and pause window from x-ratelimit-* response headers."""
+        now = time.monotonic()
+        limit_tokens = _header_number(headers, 'x-ratelimit-limit-tokens')
+        remaining_tokens = _header_number(headers, 'x-ratelimit-remaining-tokens')
+        remaining_requests = _header_number(headers, 'x-ratelimit-remaining-requests')
+
+        if limit_tokens is not None:
+            if self.tokens_per_minute is None:
+                self._tokens = limit_tokens
+                self._last_refill = now
+            self.tokens_per_minute = limit_tokens
+        if remaining_tokens is not None and self.tokens_per_minute is not None:
+            self._refill(now)
+            self._tokens = min(self._tokens, remaining_tokens)
+
+        # Nearly out of requests for this window: hold new ones until it resets
+        if remaining_requests is not None and remaining_requests <= self.in_flight:
+            reset = parse_duration(headers.get('x-ratelimit-reset-requests'))
+            if reset:
+                self._paused_until = max(self._paused_until, now + reset)
+
+    def record_response(self, status: int, headers):
+        self.update_from_headers(headers)
+        if status == 429:
+            retry_after = parse_duration(headers.get('retry-after'))
+            if retry_after is None:
+                retry_after = parse_duration(headers.get('x-ratelimit-reset-requests'))
+            self.on_rate_limited(retry_after)
+        elif status < 400:
+            self.on_success()
+
+
+_limiters = {}
+
+
+def get_limiter(name: str = "openai", **kwargs) -> AdaptiveLimiter:
+    """Returns the process-wide limiter for an API account, creating it on first use."""
+    if name not in _limiters:
+        _limiters[name] = AdaptiveLimiter(**kwargs)
+    return _limiters[name]
+
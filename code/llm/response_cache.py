@@ -0,0 +1,134 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+
+logger = logging.getLogger(__name__)
+
+# Set LLM_CACHE_PATH to an empty string to disable caching
+DEFAULT_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "llm_response_cache.sqlite")
+DEFAULT_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+
+
+def cache_key(payload: dict) -> str:
+    """Content hash of a whole chat request payload (model, messages, temperature, max_tokens, ...)."""
+    text = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def is_cacheable(payload: dict) -> bool:
+    """Only deterministic requests are cached; a missing temperature means the API default of 1."""
+    return payload.get("temperature") == 0
+
+
+class ResponseCache:
+    """
+    Persistent LLM response cache backed by SQLite.
+
+    Entries are keyed by a hash of the request payload and evicted
+    least-recently-used once the stored responses exceed `max_bytes`.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+        # Stored size kept by triggers, so it is exact for every process sharing the file
+        self._conn.execute("CREATE TABLE IF NOT EXISTS cache_size (id INTEGER PRIMARY KEY CHECK (id = 0), bytes INTEGER NOT NULL)")
+        self._conn.execute("INSERT OR IGNORE INTO cache_size VALUES (0, (SELECT COALESCE(SUM(size), 0) FROM responses))")
+        self._conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS responses_insert AFTER INSERT ON responses "
+            "BEGIN UPDATE cache_size SET bytes = bytes + NEW.size; END"
+        )
+        self._conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS responses_delete AFTER DELETE ON responses "
+            "BEGIN UPDATE cache_size SET bytes = bytes - OLD.size; END"
+        )
+        self._conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS responses_update AFTER UPDATE OF size ON responses "
+            "BEGIN UPDATE cache_size SET bytes = bytes + NEW.size - OLD.size; END"
+        )
+        self._total_bytes = self._stored_bytes()
+
+    def get(self, key: str):
+        row = self._conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0])
+
+    def put(self, key: str, response):
+        text = json.dumps(response, ensure_ascii=False)
+        size = len(text.encode('utf-8'))
+        # An upsert rather than INSERT OR REPLACE, whose implicit delete skips the triggers
+        self._conn.execute(
+            "INSERT INTO responses (key, response, size, last_access) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET response = excluded.response, size = excluded.size, "
+            "last_access = excluded.last_access",
+            (key, text, size, time.time())
+        )
+        self._total_bytes = self._stored_bytes()
+        if self._total_bytes > self.max_bytes:
+            self._evict()
+
+    def _stored_bytes(self) -> int:
+        return self._conn.execute("SELECT bytes FROM cache_size").fetchone()[0]
+
+    def _evict(self):
+        """
+        Drops least-recently-used entries until the cache is back under 90% of max_bytes.
+        Runs in one write transaction, with the stored size recomputed from the entries,
+        so processes sharing the file do not evict against stale totals.
+        """
+        self._conn.execute("BEGIN IMMEDIATE")
+        self._conn.execute("UPDATE cache_size SET bytes = (SELECT COALESCE(SUM(size), 0) FROM responses)")
+        self._total_bytes = self._stored_bytes()
+        target = self.max_bytes * 0.9
+        to_delete = []
+        if self._total_bytes > target:
+            for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY last_access").fetchall():
+                if self._total_bytes <= target:
+                    break
+                to_delete.append((key,))
+                self._total_bytes -= size
+            self._conn.executemany("DELETE FROM responses WHERE key = ?", to_delete)
+        self._conn.execute("COMMIT")
+        self.evictions += len(to_delete)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "bytes": self._stored_bytes()
+        }
+
+    def close(self):
+        self._conn.close()
+
+
+_cache = None
+
+
+def get_response_cache():
+    """Returns the process-wide response cache, or None if caching is disabled."""
+    global _cache
+    if _cache is None and DEFAULT_CACHE_PATH:
+        _cache = ResponseCache(DEFAULT_CACHE_PATH)
+    return _cache
@@ -0,0 +1,46 @@
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+# Encoding used when tiktoken is installed (gpt-4o family)
+TIKTOKEN_ENCODING = "o200k_base"
+
+_WORD_OR_SYMBOL = re.compile(r"\w+|[^\w\s]")
+
+_encoding = None
+_encoding_failed = False
+
+
+def _get_encoding():
+    global _encoding, _encoding_failed
+    if _encoding is None and not _encoding_failed:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding(TIKTOKEN_ENCODING)
+        except Exception as e:
+            # tiktoken is optional; its encodings may also be unavailable offline
+            logger.debug(f"tiktoken unavailable, using heuristic token counts: {e}")
+            _encoding_failed = True
+    return _encoding
+
+
+def heuristic_token_count(text: str) -> int:
+    """
+    Tokenizer-free estimate: one token per punctuation mark and per word piece
+    of up to four characters, which tracks BPE counts on English prose closely.
+    """
+    count = 0
+    for piece in _WORD_OR_SYMBOL.findall(text):
+        count += (len(piece) + 3) // 4
+    return count
+
+
+def estimate_tokens(text: str) -> int:
+    """Counts tokens with tiktoken when it is installed, otherwise estimates them offline."""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return heuristic_token_count(text)
@@ -0,0 +1,83 @@
+import asyncio
+from collections import OrderedDict, deque
+
+
+class FairScheduler:
+    """
+    Concurrency limit shared by several jobs (e.g. corpora), granted round-robin.
+
+    Each job requests slots through its own lane; when slots are contended, a freed
+    slot goes to the next job in rotation that has a request waiting, so a job with
+    thousands of queued requests cannot starve the others. Lanes are drop-in
+    replacements for an asyncio.Semaphore used as `async with lane:`.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_use = 0
+        self._waiters = OrderedDict()  # job key -> deque of futures, in rotation order
+
+    def lane(self, key) -> "SchedulerLane":
+        return SchedulerLane(self, key)
+
+    def waiting(self) -> int:
+        return sum(len(queue) for queue in self._waiters.values())
+
+    async def acquire(self, key):
+        if self.in_use < self.limit and not self._waiters:
+            self.in_use += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(key, deque()).append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just before the cancellation; pass it on
+                self.release()
+            else:
+                self._discard(key, future)
+            raise
+
+    def release(self):
+        self.in_use -= 1
+        self._grant()
+
+    def _grant(self):
+        while self.in_use < self.limit and self._waiters:
+            key, queue = next(iter(self._waiters.items()))
+            future = queue.popleft()
+            # Rotate the job to the back; drop it from the rotation once it has nobody waiting
+            del self._waiters[key]
+            if queue:
+                self._waiters[key] = queue
+            if future.done():
+                continue
+            self.in_use += 1
+            future.set_result(None)
+
+    def _discard(self, key, future):
+        queue = self._waiters.get(key)
+        if queue is None:
+            return
+        try:
+            queue.remove(future)
+        except ValueError:
+            pass
+        if not queue:
+            del self._waiters[key]
+
+
+class SchedulerLane:
+    """One job's handle on a FairScheduler."""
+
+    def __init__(self, scheduler: FairScheduler, key):
+        self.scheduler = scheduler
+        self.key = key
+
+    async def __aenter__(self):
+        await self.scheduler.acquire(self.key)
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.scheduler.release()
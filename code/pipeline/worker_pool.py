@@ -0,0 +1,64 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+async def imap_unordered(func, items, num_workers: int, queue_size: int = None):
+    """
+    Runs `func` over `items` with a fixed pool of async workers.
+
+    Items are pulled from a bounded queue as soon as a worker is free, so one slow
+    item never holds back the others, and (item, result) pairs are yielded in
+    completion order. An item whose call raises is logged and yields a None result.
+
+    Args:
+        func: Coroutine function called with a single item.
+        items: Iterable of items; consumed lazily by a producer task.
+        num_workers (int): Number of concurrent workers.
+        queue_size (int, optional): Maximum number of items queued ahead of the workers.
+    """
+    input_queue = asyncio.Queue(maxsize=queue_size or 2 * num_workers)
+    output_queue = asyncio.Queue()
+    producer_error = []
+
+    async def producer():
+        try:
+            for item in items:
+                await input_queue.put(item)
+        except Exception as e:
+            producer_error.append(e)
+        finally:
+            for _ in range(num_workers):
+                await input_queue.put(_DONE)
+
+    async def worker():
+        while True:
+            item = await input_queue.get()
+            if item is _DONE:
+                await output_queue.put(_DONE)
+                return
+            try:
+                result = await func(item)
+            except Exception as e:
+                logger.error(f"Worker failed on item {item!r}: {e}")
+                result = None
+            await output_queue.put((item, result))
+
+    tasks = [asyncio.ensure_future(producer())]
+    tasks.extend(asyncio.ensure_future(worker()) for _ in range(num_workers))
+    try:
+        finished_workers = 0
+        while finished_workers < num_workers:
+            entry = await output_queue.get()
+            if entry is _DONE:
+                finished_workers += 1
+                continue
+            yield entry
+        if producer_error:
+            raise producer_error[0]
+    finally:
+        for task in tasks:
+            task.cancel()
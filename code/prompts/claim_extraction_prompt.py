@@ -1,7 +1,20 @@
 # #%%
 import json
+import re
 from typing import List, Dict, Any, Optional
 
+from llm.tokens import estimate_tokens
+
+# Token budget for the paper body in a single claim-extraction request
+MAX_BODY_TOKENS = 12000
+# Chunks smaller than this share of the budget are merged into the previous chunk,
+# since each one costs a full request with the system prompt
+MIN_CHUNK_SHARE = 0.1
+
+# A heading is a short line, optionally numbered ("3.2", "IV.", "A."), without a final period
+HEADING_PATTERN = re.compile(r'^(?:(?:\d+(?:\.\d+)*|[IVXLC]+|[A-Z])\.?\s+)?[A-Z][^\n]{0,80}$')
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
 def prepare_claim_extraction_message(
     title: str,
     abstract: str,
@@ -113,6 +126,146 @@ Notes:
     # Return the message as a Python dictionary
     return message
 
+
+def _is_heading(paragraph: str) -> bool:
+    return '\n' not in paragraph and not paragraph.endswith('.') and bool(HEADING_PATTERN.match(paragraph))
+
+
+def _split_sections(body: str) -> List[List[str]]:
+    """Groups the paragraphs of a paper body into sections, each starting with its heading if it has one."""
+    sections = [[]]
+    for paragraph in re.split(r'\n\s*\n|\n(?=\S)', body):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if _is_heading(paragraph) and sections[-1]:
+            sections.append([])
+        sections[-1].append(paragraph)
+    return [section for section in sections if section]
+
+
+def _split_oversized(text: str, max_tokens: int) -> List[str]:
+    """Splits a paragraph that exceeds the budget at sentence boundaries, then by characters."""
+    pieces = []
+    current = []
+    current_tokens = 0
+    for sentence in SENTENCE_END.split(text):
+        tokens = estimate_tokens(sentence)
+        if tokens > max_tokens:
+            # A single sentence over budget: cut it into character windows
+            step = max(1, len(sentence) * max_tokens // tokens)
+            sentence_parts = [sentence[i:i + step] for i in range(0, len(sentence), step)]
+        else:
+            sentence_parts = [sentence]
+        for part in sentence_parts:
+            part_tokens = tokens if len(sentence_parts) == 1 else estimate_tokens(part)
+            if current and current_tokens + part_tokens > max_tokens:
+                pieces.append(' '.join(current))
+                current, current_tokens = [], 0
+            current.append(part)
+            current_tokens += part_tokens
+    if current:
+        pieces.append(' '.join(current))
+    return pieces
+
+
+def chunk_paper_body(body: str, max_tokens: int = MAX_BODY_TOKENS, min_tokens: Optional[int] = None) -> List[str]:
+    """
+    Splits a paper body into chunks of at most `max_tokens` estimated tokens.
+
+    Whole sections are packed together where they fit; a section that is too long
+    is split at paragraph (then sentence) boundaries and its heading is repeated at
+    the top of every chunk so the model can still name the section. A remainder
+    below `min_tokens` is merged into the previous chunk, which may then exceed
+    `max_tokens` by at most that much.
+
+    Args:
+        body (str): The body content of the paper.
+        max_tokens (int): Token budget per chunk.
+        min_tokens (Optional[int]): Smallest chunk sent on its own; defaults to
+            MIN_CHUNK_SHARE of `max_tokens`.
+
+    Returns:
+        List[str]: The chunks, in reading order. A body within budget is returned unchanged.
+    """
+    if estimate_tokens(body) <= max_tokens:
+        return [body]
+
+    chunks = []
+    current = []
+    current_tokens = 0
+
+    def flush():
+        nonlocal current, current_tokens
+        if current:
+            chunks.append('\n\n'.join(current))
+        current, current_tokens = [], 0
+
+    for section in _split_sections(body):
+        section_text = '\n\n'.join(section)
+        section_tokens = estimate_tokens(section_text)
+        if section_tokens <= max_tokens:
+            if current_tokens + section_tokens > max_tokens:
+                flush()
+            current.append(section_text)
+            current_tokens += section_tokens
+            continue
+
+        # Section over budget: split by paragraphs, carrying the heading along
+        flush()
+        heading = section[0] if _is_heading(section[0]) else None
+        paragraphs = section[1:] if heading else section
+        heading_tokens = estimate_tokens(heading) if heading else 0
+        budget = max(1, max_tokens - heading_tokens)
+        for paragraph in paragraphs:
+            paragraph_tokens = estimate_tokens(paragraph)
+            parts = [paragraph] if paragraph_tokens <= budget else _split_oversized(paragraph, budget)
+            for part in parts:
+                part_tokens = paragraph_tokens if len(parts) == 1 else estimate_tokens(part)
+                if current and current_tokens + part_tokens > max_tokens:
+                    flush()
+                if not current and heading:
+                    current.append(heading)
+                    current_tokens = heading_tokens
+                current.append(part)
+                current_tokens += part_tokens
+        flush()
+    flush()
+
+    if min_tokens is None:
+        min_tokens = int(max_tokens * MIN_CHUNK_SHARE)
+    merged = []
+    for chunk in chunks:
+        if merged and estimate_tokens(chunk) < min_tokens:
+            merged[-1] += '\n\n' + chunk
+        else:
+            merged.append(chunk)
+    return merged
+
+
+def prepare_claim_extraction_messages(
+    title: str,
+    abstract: str,
+    body: str,
+    max_body_tokens: int = MAX_BODY_TOKENS
+) -> List[Dict[str, Any]]:
+    """
+    Prepares one claim-extraction message per body chunk (see chunk_paper_body).
+
+    Args:
+        title (str): The title of the paper.
+        abstract (str): The abstract of the paper.
+        body (str): The body content of the paper.
+        max_body_tokens (int): Token budget for the body part of each message.
+
+    Returns:
+        List[Dict[str, Any]]: The structured messages; a single message for papers within budget.
+    """
+    return [
+        prepare_claim_extraction_message(title, abstract, chunk)
+        for chunk in chunk_paper_body(body, max_body_tokens)
+    ]
+
 # #%%
 # def make_claim_extraction_from_paper_query(title: str,abstract:str, body:str) -> str:
    
@@ -55,4 +55,105 @@ def claim_to_citances_prompt(claims_citances_batch):
     ])
 
     prompt = instruction + "\n\n" + batch_text
+    return prompt
+
+
+
+
+
+
+def _numbered_batch_text(query_label, candidate_label, queries, candidates, candidate_lists):
+    """Candidates numbered once ([1] text), then one line per query with the numbers to score it against."""
+    candidates_text = f"{candidate_label.capitalize()}s:\n" + "\n".join([f"[{idx+1}] {candidate}" for idx, candidate in enumerate(candidates)])
+
+    query_lines = []
+    for idx, query in enumerate(queries):
+        line = f"{query_label.capitalize()} {idx+1}: {query}"
+        if candidate_lists is not None:
+            line += f"\nScore against {candidate_label}s: " + ", ".join(str(j + 1) for j in candidate_lists[idx])
+        query_lines.append(line)
+    return candidates_text + "\n\n" + "\n".join(query_lines)
+
+
+def citance_to_claims_compact_prompt(citances, claims, candidates=None):
+    """
+    Compact form of citance_to_claims_prompt: each claim is sent once, numbered, and
+    the model answers with [claim number, dm] pairs instead of echoing texts.
+
+    Args:
+        citances (list): Citance texts.
+        claims (list): Claim texts, numbered from 1 in the prompt.
+        candidates (list, optional): For each citance, the (0-based) indices of the claims
+            to score it against. All claims when omitted.
+
+    Returns:
+        str: The prompt.
+    """
+    instruction = """For each citance provided (citation sentences in other papers), evaluate how accurately each of its claims represents the citance by assigning a degree of match (0-10).
+Claims and citances are numbered; refer to them by number only.
+
+ Respond **only** in JSON format without any additional text or code fences, with one [claim number, dm] pair per scored claim:
+
+{
+    "citance_to_claims": [
+        {"citance": 1, "matches": [[1, ...], [2, ...]]},
+        ...
+    ]
+}
+"""
+
+    return instruction + "\n\n" + _numbered_batch_text("citance", "claim", citances, claims, candidates)
+
+
+def claim_to_citances_compact_prompt(claims, citances, candidates=None):
+    """
+    Compact form of claim_to_citances_prompt: each citance is sent once, numbered, and
+    the model answers with [citance number, dm] pairs instead of echoing texts.
+
+    Args:
+        claims (list): Claim texts.
+        citances (list): Citance texts, numbered from 1 in the prompt.
+        candidates (list, optional): For each claim, the (0-based) indices of the citances
+            to score it against. All citances when omitted.
+
+    Returns:
+        str: The prompt.
+    """
+    instruction = """For each claim provided, evaluate how accurately each of its citances (citation sentences in other papers) represents the claim by assigning a degree of match (0-10).
+Claims and citances are numbered; refer to them by number only.
+
+ Respond **only** in JSON format without any additional text or code fences, with one [citance number, dm] pair per scored citance:
+
+{
+    "claim_to_citances": [
+        {"claim": 1, "matches": [[1, ...], [2, ...]]},
+        ...
+    ]
+}
+"""
+
+    return instruction + "\n\n" + _numbered_batch_text("claim", "citance", claims, citances, candidates)
+
+
+def citance_claim_scores_prompt(citances, claims, candidates=None):
+    """
+    Single-pass prompt that scores each (citance, claim) pair once.
+
+    citances and claims are lists of texts; candidates, if given, holds for each
+    citance the (0-based) indices of the claims it should be scored against.
+    """
+    instruction = """For each citance provided (citation sentences in other papers), evaluate how accurately each claim represents the citance, and the citance the claim, by assigning a single degree of match (0-10) per pair.
+Claims and citances are numbered; refer to them by number only.
+
+ Respond **only** in JSON format without any additional text or code fences:
+
+{
+    "scores": [
+        {"citance": 1, "claim": 1, "dm": ...},
+        ...
+    ]
+}
+"""
+
+    prompt = instruction + "\n\n" + _numbered_batch_text("citance", "claim", citances, claims, candidates)
     return prompt
\ No newline at end of file
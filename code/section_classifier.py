@@ -0,0 +1,277 @@
+"""Hashed character n-gram linear classifier for section headings.
+
+Fallback for headings that neither section_map.mapping nor fuzzy matching can label:
+a softmax regression over hashed character n-grams of the normalized heading, trained
+offline from the mapping with NumPy only and saved as .npz. SectionResolver uses it as
+its last tier (see section_resolver.get_section_resolver).
+
+    python section_classifier.py --train            # writes section_classifier.npz
+    python section_resolver.py --build              # same, together with section_map.bin
+    python section_classifier.py "Ablation of the encoder" "Threats to validity"
+"""
+import argparse
+import os
+
+import numpy as np
+
+from section_resolver import NON_SECTION_HEADINGS
+
+DEFAULT_MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'section_classifier.npz')
+
+NUM_FEATURES = 1 << 15
+NGRAM_RANGE = (2, 4)
+
+# Label of the extra class trained on headings that are not body sections; predicted as None
+NON_SECTION = ''
+# Minimum share of a heading's words that must occur in the training section headings
+MIN_KNOWN_WORD_SHARE = 0.5
+
+def non_section_examples(seed: int = 0, random_count: int = 200) -> list:
+    """NON_SECTION_HEADINGS plus numbered captions and random letter strings."""
+    rng = np.random.default_rng(seed)
+    examples = list(NON_SECTION_HEADINGS)
+    for number in range(1, 13):
+        examples += [f"table {number}", f"figure {number}", f"fig {number}", f"appendix {chr(96 + number)}"]
+    letters = np.array(list('abcdefghijklmnopqrstuvwxyz'))
+    for _ in range(random_count):
+        words = [''.join(rng.choice(letters, rng.integers(2, 9))) for _ in range(rng.integers(1, 4))]
+        examples.append(' '.join(words))
+    return examples
+
+
+def heading_words(normalized: str) -> list:
+    return [word for word in normalized.split() if not word.isdigit()]
+
+
+def featurize(normalized_headings, num_features: int = NUM_FEATURES, ngram_range=NGRAM_RANGE):
+    """
+    Sparse rows of a batch of normalized headings as flat arrays (row ids, feature ids,
+    values): hashed character n-gram counts of each space-padded heading, L2-normalized.
+
+    All headings are hashed at once: the padded headings are concatenated into one byte
+    array and each n-gram hash is a polynomial over a sliding window, so the cost per
+    heading is a few NumPy passes rather than a Python loop over its n-grams.
+    """
+    encoded = [f" {heading} ".encode('utf-8') for heading in normalized_headings]
+    lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+    num_rows = len(encoded)
+    max_n = ngram_range[1]
+    data = np.frombuffer(b''.join(encoded) + b'\0' * max_n, dtype=np.uint8).astype(np.uint64)
+    row_of = np.repeat(np.arange(num_rows, dtype=np.int64), lengths)
+    row_end = np.repeat(np.cumsum(lengths), lengths)
+    positions = np.arange(len(row_of), dtype=np.int64)
+    shift = np.uint64(64 - (num_features.bit_length() - 1))
+
+    keys = []
+    for n in range(ngram_range[0], ngram_range[1] + 1):
+        valid = positions + n <= row_end
+        starts = positions[valid]
+        hashes = np.full(len(starts), n, dtype=np.uint64)
+        for offset in range(n):
+            hashes = hashes * np.uint64(1000003) + data[starts + offset]
+        # Fibonacci hashing: the top bits of the product are well mixed
+        features = (hashes * np.uint64(0x9E3779B97F4A7C15)) >> shift
+        keys.append(row_of[valid] * num_features + features.astype(np.int64))
+    keys, counts = np.unique(np.concatenate(keys), return_counts=True)
+
+    rows = keys // num_features
+    values = counts.astype(np.float32)
+    norms = np.sqrt(np.bincount(rows, values * values, minlength=num_rows))
+    return rows, keys % num_features, (values / norms[rows]).astype(np.float32)
+
+
+def _segment_sum(matrix, segment_ids, num_segments):
+    """Sums the rows of `matrix` per segment id; `segment_ids` must be sorted."""
+    sums = np.zeros((num_segments, matrix.shape[1]), dtype=matrix.dtype)
+    if len(segment_ids):
+        starts = np.flatnonzero(np.r_[True, segment_ids[1:] != segment_ids[:-1]])
+        sums[segment_ids[starts]] = np.add.reduceat(matrix, starts, axis=0)
+    return sums
+
+
+def _logits(weights, bias, rows, features, values, num_rows):
+    return _segment_sum(weights[features] * values[:, None], rows, num_rows) + bias
+
+
+def _softmax(logits):
+    logits = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(logits)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+class SectionClassifier:
+    """
+    Softmax regression over hashed character n-grams. Besides the section labels it has
+    a NON_SECTION class (back matter, captions, junk), and headings with too few words
+    from the training vocabulary are not classified at all; both come out as None.
+
+    Args:
+        weights (np.ndarray): (num_features, num_labels) weight matrix.
+        bias (np.ndarray): (num_labels,) bias.
+        labels (list): Label names in column order.
+        vocabulary (set): Words of the section headings the model was trained on.
+    """
+
+    def __init__(self, weights, bias, labels, vocabulary, ngram_range=NGRAM_RANGE):
+        self.weights = weights
+        self.bias = bias
+        self.labels = list(labels)
+        self.vocabulary = set(vocabulary)
+        self.ngram_range = tuple(ngram_range)
+
+    @property
+    def num_features(self) -> int:
+        return self.weights.shape[0]
+
+    @classmethod
+    def train(cls, normalized_headings, labels, epochs: int = 60, learning_rate: float = 0.5,
+              l2: float = 1e-5, num_features: int = NUM_FEATURES, seed: int = 0) -> "SectionClassifier":
+        """
+        Full-batch softmax regression with Adam. Classes are weighted by inverse square-root
+        frequency so that Methods (most of the mapping) does not swallow the rare labels.
+        """
+        label_names = sorted(set(labels))
+        label_ids = np.array([label_names.index(label) for label in labels])
+        num_rows, num_labels = len(label_ids), len(label_names)
+        rows, features, values = featurize(normalized_headings, num_features)
+        # Only the hashed features seen in training can get a gradient: train those
+        # compactly, with the nonzeros also ordered by feature for the gradient sums
+        seen, features = np.unique(features, return_inverse=True)
+        by_feature = np.argsort(features, kind='stable')
+
+        targets = np.zeros((num_rows, num_labels), dtype=np.float32)
+        targets[np.arange(num_rows), label_ids] = 1.0
+        frequency = np.bincount(label_ids, minlength=num_labels)
+        class_weights = (frequency.max() / np.maximum(frequency, 1)) ** 0.5
+        row_weights = (class_weights[label_ids] / class_weights[label_ids].sum()).astype(np.float32)[:, None]
+
+        rng = np.random.default_rng(seed)
+        weights = (rng.standard_normal((len(seen), num_labels)) * 0.01).astype(np.float32)
+        bias = np.zeros(num_labels, dtype=np.float32)
+        moments = [np.zeros_like(weights), np.zeros_like(weights), np.zeros_like(bias), np.zeros_like(bias)]
+        beta1, beta2, eps = 0.9, 0.999, 1e-8
+        for step in range(1, epochs + 1):
+            probabilities = _softmax(_logits(weights, bias, rows, features, values, num_rows))
+            error = (probabilities - targets) * row_weights
+            contributions = (error[rows] * values[:, None])[by_feature]
+            grad_weights = l2 * weights + _segment_sum(contributions, features[by_feature], len(seen))
+            grad_bias = error.sum(axis=0)
+            for param, grad, m, v in ((weights, grad_weights, moments[0], moments[1]), (bias, grad_bias, moments[2], moments[3])):
+                m *= beta1
+                m += (1 - beta1) * grad
+                v *= beta2
+                v += (1 - beta2) * grad * grad
+                param -= learning_rate * (m / (1 - beta1 ** step)) / (np.sqrt(v / (1 - beta2 ** step)) + eps)
+        full_weights = np.zeros((num_features, num_labels), dtype=np.float32)
+        full_weights[seen] = weights
+        weights = full_weights
+        vocabulary = {word for heading, label in zip(normalized_headings, labels) if label != NON_SECTION
+                      for word in heading_words(heading)}
+        return cls(weights, bias, label_names, vocabulary)
+
+    def known_word_share(self, normalized: str) -> float:
+        words = heading_words(normalized)
+        if not words:
+            return 0.0
+        return sum(word in self.vocabulary for word in words) / len(words)
+
+    def predict_proba(self, normalized_headings) -> np.ndarray:
+        rows, features, values = featurize(normalized_headings, self.num_features, self.ngram_range)
+        return _softmax(_logits(self.weights, self.bias, rows, features, values, len(normalized_headings)))
+
+    def predict(self, normalized_headings) -> list:
+        """
+        Returns (label, confidence) per normalized heading; confidence is the softmax
+        probability. Non-section and out-of-vocabulary headings give (None, 0.0).
+        """
+        if not normalized_headings:
+            return []
+        probabilities = self.predict_proba(normalized_headings)
+        best = probabilities.argmax(axis=1)
+        predictions = []
+        for row, idx in enumerate(best):
+            label = self.labels[idx]
+            if label == NON_SECTION or self.known_word_share(normalized_headings[row]) < MIN_KNOWN_WORD_SHARE:
+                predictions.append((None, 0.0))
+            else:
+                predictions.append((label, float(probabilities[row, idx])))
+        return predictions
+
+    def save(self, path: str = DEFAULT_MODEL_PATH):
+        np.savez_compressed(path, weights=self.weights, bias=self.bias, labels=np.array(self.labels),
+                            vocabulary=np.array(sorted(self.vocabulary)), ngram_range=np.array(self.ngram_range))
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_MODEL_PATH) -> "SectionClassifier":
+        with np.load(path) as data:
+            return cls(data['weights'], data['bias'], [str(label) for label in data['labels']],
+                       [str(word) for word in data['vocabulary']], data['ngram_range'])
+
+
+def training_data():
+    """(normalized heading, label) pairs from section_map.mapping, plus the NON_SECTION examples."""
+    from section_map import mapping
+    from section_resolver import normalize_heading
+
+    pairs = {}
+    for heading, label in mapping.items():
+        pairs.setdefault(normalize_heading(heading), label)
+    for heading in non_section_examples():
+        pairs.setdefault(heading, NON_SECTION)
+    return list(pairs.keys()), list(pairs.values())
+
+
+def holdout_report(headings, labels, min_confidence: float = 0.7, fraction: float = 0.2, seed: int = 0, **train_kwargs) -> dict:
+    """
+    Trains on all but a random `fraction` of the headings and scores the rest. For held-out
+    section headings: accuracy, and the share answered and accuracy at confidence >=
+    min_confidence. For held-out NON_SECTION examples: the share left unlabeled.
+    """
+    order = np.random.default_rng(seed).permutation(len(headings))
+    cut = int(len(order) * fraction)
+    test, train = order[:cut], order[cut:]
+    model = SectionClassifier.train([headings[i] for i in train], [labels[i] for i in train], **train_kwargs)
+    predictions = model.predict([headings[i] for i in test])
+    is_section = np.array([labels[i] != NON_SECTION for i in test])
+    correct = np.array([label == labels[i] for (label, _), i in zip(predictions, test)])
+    confident = np.array([label is not None and confidence >= min_confidence for label, confidence in predictions])
+    answered = confident & is_section
+    return {
+        'accuracy': float(correct[is_section].mean()),
+        'answered': float(answered.sum() / is_section.sum()),
+        'confident_accuracy': float(correct[answered].mean()) if answered.any() else None,
+        'non_section_rejected': float(1 - confident[~is_section].mean()) if (~is_section).any() else None
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Train or query the section heading classifier.")
+    parser.add_argument('--train', action='store_true', help="Train on section_map.mapping and save the model.")
+    parser.add_argument('--model', type=str, default=DEFAULT_MODEL_PATH, help="Path of the .npz model.")
+    parser.add_argument('--epochs', type=int, default=60, help="Training epochs.")
+    parser.add_argument('--min_confidence', type=float, default=0.7, help="Confidence cutoff reported for the holdout split.")
+    parser.add_argument('headings', nargs='*', help="Headings to classify.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.train:
+        headings, labels = training_data()
+        report = holdout_report(headings, labels, args.min_confidence, epochs=args.epochs)
+        print(f"Holdout (20%): accuracy {report['accuracy']:.3f}; at confidence >= {args.min_confidence}: "
+              f"{report['answered']:.1%} answered, accuracy {report['confident_accuracy']:.3f}; "
+              f"non-section headings left unlabeled: {report['non_section_rejected']:.1%}")
+        model = SectionClassifier.train(headings, labels, epochs=args.epochs)
+        model.save(args.model)
+        print(f"Trained on {len(headings)} headings; saved to {args.model}")
+    if args.headings:
+        from section_resolver import normalize_heading
+
+        model = SectionClassifier.load(args.model)
+        for heading, (label, confidence) in zip(args.headings, model.predict([normalize_heading(h) for h in args.headings])):
+            print(f"{heading}\t{label}\t{confidence:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+import argparse
+import logging
+import os
+import re
+import struct
+from collections import Counter
+from functools import lru_cache
+
+from section_table import DEFAULT_TABLE_PATH, SectionTable, build_section_table, is_stale
+
+logger = logging.getLogger(__name__)
+
+# Leading numbering: "3.2 ", "4. ", "iv. ", "b) ", "section 2 "
+HEADING_NUMBER = re.compile(r'^(?:(?:section|chapter|appendix)\s+)?(?:\d+(?:\.\d+)*\.?|[ivxlc]+[.)]|[a-z][.)])\s+')
+NON_ALNUM = re.compile(r'[^a-z0-9]+')
+
+# Back matter, front matter and float captions: headings that section_map never labels
+NON_SECTION_HEADINGS = [
+    "acknowledgments", "acknowledgements", "acknowledgment", "references", "bibliography",
+    "funding", "funding information", "financial support", "conflict of interest",
+    "conflicts of interest", "competing interests", "declaration of competing interest",
+    "author contributions", "authors contributions", "credit authorship contribution statement",
+    "data availability", "data availability statement", "code availability", "ethics statement",
+    "ethical approval", "informed consent", "supplementary information", "supporting information",
+    "additional information", "author information", "corresponding author", "keywords",
+    "index terms", "ccs concepts", "abbreviations", "nomenclature", "copyright", "license",
+    "table of contents", "list of figures", "list of tables", "notes", "footnotes", "disclaimer",
+    "publisher s note", "open access", "biography", "about the authors", "appendix",
+]
+NON_SECTION = frozenset(NON_SECTION_HEADINGS)
+
+
+def normalize_heading(heading: str) -> str:
+    """Lowercases a section heading and strips leading numbering and punctuation."""
+    heading = str(heading).lower().strip()
+    heading = HEADING_NUMBER.sub('', heading)
+    return NON_ALNUM.sub(' ', heading).strip()
+
+
+def char_trigrams(text: str) -> set:
+    """Character trigrams of each word, padded so short words and word edges count."""
+    trigrams = set()
+    for word in text.split():
+        padded = f" {word} "
+        trigrams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return trigrams
+
+
+def compile_tables(mapping: dict) -> dict:
+    """The two exact-lookup tables of the resolver: lowercased and normalized headings."""
+    lower = {heading.lower(): label for heading, label in mapping.items()}
+    normalized = {}
+    for heading, label in mapping.items():
+        normalized.setdefault(normalize_heading(heading), label)
+    return {'lower': lower, 'normalized': normalized}
+
+
+class SectionResolver:
+    """
+    Maps raw section headings to section labels (Methods, Results, ...).
+
+    Lookups go from cheapest to most expensive:
+      1. the lowercased heading in the mapping (what section_map.mapping alone gives),
+      2. the normalized heading (numbering and punctuation stripped), both O(1) dict hits;
+         known non-section headings (NON_SECTION_HEADINGS) stop here,
+      3. fuzzy match: the known heading sharing the most character trigrams, found
+         through an inverted trigram index and accepted at Jaccard >= min_similarity,
+      4. the classifier, if given: its predicted label when confidence >= min_confidence.
+    Results are kept in an LRU cache, since the same headings recur across papers.
+    Returns None when nothing matches closely enough. The trigram index is built on
+    the first fuzzy lookup, so processes that only see known headings never pay for it.
+    resolve_many sends all of its classifier lookups as one batch. With `classifier_loader`
+    the classifier (and NumPy) is only loaded once a heading gets past the first three tiers.
+
+    Args:
+        mapping (dict, optional): Heading -> label; defaults to section_map.mapping.
+        min_similarity (float): Minimum trigram Jaccard similarity for a fuzzy match.
+        cache_size (int): Number of headings kept in the LRU cache.
+        table (SectionTable, optional): Compiled tables to look up in instead of `mapping`.
+        classifier (SectionClassifier, optional): Fallback for headings nothing else matches.
+        min_confidence (float): Minimum classifier confidence for its label to be used.
+        classifier_loader (callable, optional): Returns the classifier (or None); called
+            on the first heading the lookup tiers miss, if `classifier` is not given.
+    """
+
+    def __init__(self, mapping: dict = None, min_similarity: float = 0.5, cache_size: int = 100000,
+                 table: SectionTable = None, classifier=None, min_confidence: float = 0.7,
+                 classifier_loader=None):
+        self.min_similarity = min_similarity
+        self.classifier = classifier
+        self._classifier_loader = classifier_loader if classifier is None else None
+        self.min_confidence = min_confidence
+        if table is not None:
+            self._lower = table.table('lower')
+            self._normalized = table.table('normalized')
+        else:
+            if mapping is None:
+                from section_map import mapping
+            tables = compile_tables(mapping)
+            self._lower = tables['lower']
+            self._normalized = tables['normalized']
+        self._labels = None
+        self._index = None
+        self._cache_size = cache_size
+        self._cached_resolve = lru_cache(maxsize=cache_size)(self._resolve)
+        self._classified = {}  # normalized heading -> classifier label or None
+
+    def _build_index(self):
+        # Inverted index: trigram -> ids of the normalized headings containing it
+        self._labels = []
+        self._key_sizes = []
+        self._index = {}
+        for key_id, (key, label) in enumerate(self._normalized.items()):
+            trigrams = char_trigrams(key)
+            self._labels.append(label)
+            self._key_sizes.append(len(trigrams))
+            for trigram in trigrams:
+                self._index.setdefault(trigram, []).append(key_id)
+
+    def _fuzzy_lookup(self, normalized: str):
+        trigrams = char_trigrams(normalized)
+        if not trigrams:
+            return None
+        if self._index is None:
+            self._build_index()
+        shared = Counter()
+        for trigram in trigrams:
+            shared.update(self._index.get(trigram, ()))
+        best_label = None
+        best_similarity = self.min_similarity
+        for key_id, count in shared.items():
+            similarity = count / (len(trigrams) + self._key_sizes[key_id] - count)
+            if similarity >= best_similarity:
+                best_similarity = similarity
+                best_label = self._labels[key_id]
+        return best_label
+
+    def _resolve(self, heading: str):
+        label = self._lower.get(heading.lower())
+        if label is not None:
+            return label
+        normalized = normalize_heading(heading)
+        label = self._normalized.get(normalized)
+        if label is not None:
+            return label
+        # Back matter such as "author contributions" would otherwise fuzzy-match a body section
+        if normalized in NON_SECTION:
+            return None
+        return self._fuzzy_lookup(normalized)
+
+    def _get_classifier(self):
+        if self._classifier_loader is not None:
+            self.classifier = self._classifier_loader()
+            self._classifier_loader = None
+        return self.classifier
+
+    def _classify(self, headings) -> list:
+        """Classifier labels for headings the lookup tiers missed, predicting only unseen ones in one batch."""
+        normalized = [normalize_heading(heading) for heading in headings]
+        unseen = [key for key in dict.fromkeys(normalized) if key and key not in self._classified]
+        if unseen:
+            if len(self._classified) + len(unseen) > self._cache_size:
+                self._classified.clear()
+            for key, (label, confidence) in zip(unseen, self.classifier.predict(unseen)):
+                self._classified[key] = label if confidence >= self.min_confidence else None
+        return [self._classified.get(key) for key in normalized]
+
+    def resolve(self, heading):
+        """Returns the label of one heading, or None."""
+        if not heading:
+            return None
+        label = self._cached_resolve(str(heading))
+        if label is None and self._get_classifier() is not None:
+            label = self._classify([str(heading)])[0]
+        return label
+
+    def resolve_many(self, headings) -> list:
+        headings = list(headings)
+        labels = [self._cached_resolve(str(heading)) if heading else None for heading in headings]
+        missed = [i for i, (heading, label) in enumerate(zip(headings, labels)) if heading and label is None]
+        if missed and self._get_classifier() is not None:
+            for i, label in zip(missed, self._classify([str(headings[i]) for i in missed])):
+                labels[i] = label
+        return labels
+
+    def cache_info(self):
+        return self._cached_resolve.cache_info()
+
+
+_resolver = None
+
+
+def load_section_table(path: str = DEFAULT_TABLE_PATH):
+    """
+    Returns the compiled section table, (re)building it first if it is missing, older
+    than section_map.py or unreadable (empty, truncated). Returns None if it cannot be
+    built (e.g. a read-only checkout), so callers fall back to section_map.py.
+    """
+    rebuild = False
+    for _ in range(2):
+        try:
+            if rebuild or is_stale(path):
+                from section_map import mapping
+                build_section_table(path, compile_tables(mapping))
+                logger.info(f"Compiled section map to {path}")
+            table = SectionTable(path)
+            # Map and check the header now rather than on the first lookup
+            table._load()
+            return table
+        except (ValueError, struct.error) as e:
+            logger.warning(f"Unreadable section table {path}: {e}")
+            rebuild = True
+        except OSError as e:
+            logger.warning(f"Using section_map.py directly; cannot build {path}: {e}")
+            return None
+    logger.warning(f"Using section_map.py directly; {path} is still unreadable after rebuilding")
+    return None
+
+
+def build_section_classifier(path: str = None):
+    """Trains the heading classifier on section_map.mapping and saves it."""
+    from section_classifier import DEFAULT_MODEL_PATH, SectionClassifier, training_data
+
+    path = path or DEFAULT_MODEL_PATH
+    classifier = SectionClassifier.train(*training_data())
+    classifier.save(path)
+    return classifier
+
+
+def load_section_classifier(path: str = None):
+    """
+    Returns the saved heading classifier, or None if it has not been built. Training
+    takes seconds, so it only happens in the build step (python section_resolver.py --build).
+    """
+    from section_classifier import DEFAULT_MODEL_PATH, SectionClassifier
+
+    path = path or DEFAULT_MODEL_PATH
+    if not os.path.exists(path):
+        logger.warning(f"No section classifier at {path}; run `python section_resolver.py --build` to train it")
+        return None
+    if is_stale(path):
+        logger.warning(f"Section classifier {path} is older than section_map.py; rebuild with `python section_resolver.py --build`")
+    try:
+        return SectionClassifier.load(path)
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"Cannot load section classifier {path}: {e}")
+        return None
+
+
+def get_section_resolver() -> SectionResolver:
+    """
+    Returns the process-wide resolver, backed by the compiled table when available. The
+    classifier is loaded on the first heading the lookup tiers miss, so table hits never
+    import NumPy.
+    """
+    global _resolver
+    if _resolver is None:
+        table = load_section_table()
+        if table is not None:
+            _resolver = SectionResolver(table=table, classifier_loader=load_section_classifier)
+        else:
+            _resolver = SectionResolver(classifier_loader=load_section_classifier)
+    return _resolver
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compile section_map.py into a memory-mapped lookup table and train the heading classifier, or resolve headings.")
+    parser.add_argument('--build', action='store_true', help="Compile section_map.mapping into the binary table.")
+    parser.add_argument('--output', type=str, default=DEFAULT_TABLE_PATH, help="Path of the compiled table.")
+    parser.add_argument('--classifier_output', type=str, default=None, help="Path of the trained classifier (default: section_classifier.npz).")
+    parser.add_argument('--no_classifier', action='store_true', help="Resolve without the classifier fallback.")
+    parser.add_argument('headings', nargs='*', help="Headings to resolve with the compiled table.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.build:
+        from section_map import mapping
+        build_section_table(args.output, compile_tables(mapping))
+        print(f"Compiled {len(mapping)} headings to {args.output}")
+        build_section_classifier(args.classifier_output)
+        print("Trained the section classifier")
+    if args.headings:
+        loader = None if args.no_classifier else (lambda: load_section_classifier(args.classifier_output))
+        resolver = SectionResolver(table=SectionTable(args.output), classifier_loader=loader)
+        for heading, label in zip(args.headings, resolver.resolve_many(args.headings)):
+            print(f"{heading}\t{label}")
+
+
+if __name__ == "__main__":
+    main()
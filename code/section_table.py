@@ -0,0 +1,176 @@
+"""Compiled, memory-mapped form of section_map.mapping.
+
+The build step writes each key table as a sorted UTF-8 string table with one-byte
+label codes, so a lookup is a binary search over a memory-mapped file: opening it
+costs a header read, and the pages are shared by every process through the page cache.
+
+Layout (little-endian):
+    magic (8 bytes) | label count (u32) | table count (u32)
+    labels: length (u16) + UTF-8 bytes each
+    per table: name length (u16) + name | key count (u32) | offsets pos (u64) | codes pos (u64) | blob pos (u64)
+    per table data: u32 offsets[count + 1] into the blob | u8 codes[count] | blob of concatenated keys
+"""
+import mmap
+import os
+import struct
+
+MAGIC = b'SECMAP01'
+
+DEFAULT_TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'section_map.bin')
+SOURCE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'section_map.py')
+
+
+def build_section_table(path: str, tables: dict):
+    """
+    Writes the artifact atomically.
+
+    Args:
+        path (str): Output file.
+        tables (dict): Table name -> {key: label}.
+    """
+    labels = sorted({label for table in tables.values() for label in table.values()})
+    if len(labels) > 255:
+        raise ValueError("At most 255 distinct labels fit in one-byte codes")
+    label_codes = {label: code for code, label in enumerate(labels)}
+
+    header = bytearray(MAGIC + struct.pack('<II', len(labels), len(tables)))
+    for label in labels:
+        encoded = label.encode('utf-8')
+        header += struct.pack('<H', len(encoded)) + encoded
+
+    # Table directory entries are fixed-size once the names are known, so positions can be computed up front
+    directory_size = sum(2 + len(name.encode('utf-8')) + 4 + 24 for name in tables)
+    position = len(header) + directory_size
+    directory = bytearray()
+    data = bytearray()
+    for name, table in tables.items():
+        entries = sorted((key.encode('utf-8'), label_codes[label]) for key, label in table.items())
+        offsets = [0]
+        for key, _ in entries:
+            offsets.append(offsets[-1] + len(key))
+        offsets_pos = position + len(data)
+        data += struct.pack(f'<{len(offsets)}I', *offsets)
+        codes_pos = position + len(data)
+        data += bytes(code for _, code in entries)
+        blob_pos = position + len(data)
+        data += b''.join(key for key, _ in entries)
+        encoded_name = name.encode('utf-8')
+        directory += struct.pack('<H', len(encoded_name)) + encoded_name
+        directory += struct.pack('<IQQQ', len(entries), offsets_pos, codes_pos, blob_pos)
+
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, 'wb') as f:
+        f.write(header + directory + data)
+    os.replace(tmp_path, path)
+
+
+class TableView:
+    """Dict-like read access to one key table of a SectionTable."""
+
+    def __init__(self, section_table: "SectionTable", name: str):
+        self._section_table = section_table
+        self.name = name
+
+    def get(self, key: str, default=None):
+        return self._section_table.lookup(self.name, key, default)
+
+    def items(self):
+        return self._section_table.items(self.name)
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def __len__(self) -> int:
+        return self._section_table.count(self.name)
+
+
+class SectionTable:
+    """
+    Read side of the artifact. The file is mapped on the first lookup, not on construction.
+    """
+
+    def __init__(self, path: str = DEFAULT_TABLE_PATH):
+        self.path = path
+        self._mm = None
+        self.labels = None
+        self._tables = None
+
+    def _load(self):
+        if self._mm is not None:
+            return
+        with open(self.path, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if mm[:8] != MAGIC:
+            mm.close()
+            raise ValueError(f"{self.path} is not a compiled section table")
+        label_count, table_count = struct.unpack_from('<II', mm, 8)
+        pos = 16
+        labels = []
+        for _ in range(label_count):
+            (length,) = struct.unpack_from('<H', mm, pos)
+            labels.append(mm[pos + 2:pos + 2 + length].decode('utf-8'))
+            pos += 2 + length
+        tables = {}
+        for _ in range(table_count):
+            (length,) = struct.unpack_from('<H', mm, pos)
+            name = mm[pos + 2:pos + 2 + length].decode('utf-8')
+            pos += 2 + length
+            tables[name] = struct.unpack_from('<IQQQ', mm, pos)
+            pos += 28
+        # A truncated file would otherwise only fail on some lookup later
+        for name, (count, offsets_pos, labels_pos, blob_pos) in tables.items():
+            blob_end = struct.unpack_from('<I', mm, offsets_pos + 4 * count)[0] if offsets_pos + 4 * count + 4 <= len(mm) else None
+            if blob_end is None or labels_pos + count > len(mm) or blob_pos + blob_end > len(mm):
+                mm.close()
+                raise ValueError(f"{self.path} is truncated (table {name})")
+        self.labels = labels
+        self._tables = tables
+        self._mm = mm
+
+    def table(self, name: str) -> TableView:
+        return TableView(self, name)
+
+    def count(self, name: str) -> int:
+        self._load()
+        return self._tables[name][0]
+
+    def _key_at(self, name: str, index: int) -> bytes:
+        _, offsets_pos, _, blob_pos = self._tables[name]
+        start, end = struct.unpack_from('<II', self._mm, offsets_pos + 4 * index)
+        return self._mm[blob_pos + start:blob_pos + end]
+
+    def _label_at(self, name: str, index: int) -> str:
+        return self.labels[self._mm[self._tables[name][2] + index]]
+
+    def lookup(self, name: str, key: str, default=None):
+        """Binary search for `key` in one table; returns its label or `default`."""
+        self._load()
+        target = key.encode('utf-8')
+        low, high = 0, self._tables[name][0]
+        while low < high:
+            mid = (low + high) // 2
+            if self._key_at(name, mid) < target:
+                low = mid + 1
+            else:
+                high = mid
+        if low < self._tables[name][0] and self._key_at(name, low) == target:
+            return self._label_at(name, low)
+        return default
+
+    def items(self, name: str):
+        """Yields (key, label) of one table in key order."""
+        self._load()
+        for index in range(self._tables[name][0]):
+            yield self._key_at(name, index).decode('utf-8'), self._label_at(name, index)
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+
+
+def is_stale(path: str = DEFAULT_TABLE_PATH, source_path: str = SOURCE_PATH) -> bool:
+    """True when the artifact is missing or older than section_map.py."""
+    if not os.path.exists(path):
+        return True
+    return os.path.exists(source_path) and os.path.getmtime(source_path) > os.path.getmtime(path)
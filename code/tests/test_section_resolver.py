@@ -0,0 +1,23 @@
+import os
+import subprocess
+import sys
+
+CODE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def run_in_fresh_interpreter(source: str) -> str:
+    # A fresh process, since pytest or other tests may already have imported numpy
+    result = subprocess.run([sys.executable, '-c', source], cwd=CODE_DIR, capture_output=True, text=True, check=True)
+    return result.stdout.strip()
+
+
+def test_table_hits_do_not_import_numpy():
+    output = run_in_fresh_interpreter(
+        "import sys\n"
+        "import section_resolver\n"
+        "assert 'numpy' not in sys.modules, 'importing section_resolver loaded numpy'\n"
+        "resolver = section_resolver.get_section_resolver()\n"
+        "print(resolver.resolve('Introduction'))\n"
+        "assert 'numpy' not in sys.modules, 'a table hit loaded numpy'\n"
+    )
+    assert output == 'Introduction'